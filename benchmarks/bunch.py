@@ -0,0 +1,111 @@
+"""
+Benchmarks bunchify/unbunchify against the recursive implementation they
+replaced, and Bunch attribute access against dict item access, with the
+garbage collector disabled.
+
+    python benchmarks/bunch.py
+"""
+
+import gc
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tonggong.bunch import Bunch, bunchify, unbunchify  # noqa: E402
+
+
+def recursive_bunchify(x):
+    if isinstance(x, dict):
+        return Bunch((k, recursive_bunchify(v)) for k, v in dict.items(x))
+    elif isinstance(x, (list, tuple)):
+        return type(x)(recursive_bunchify(v) for v in x)
+    else:
+        return x
+
+
+def recursive_unbunchify(x):
+    if isinstance(x, dict):
+        return dict((k, recursive_unbunchify(v)) for k, v in dict.items(x))
+    elif isinstance(x, (list, tuple)):
+        return type(x)(recursive_unbunchify(v) for v in x)
+    else:
+        return x
+
+
+def chain(depth):
+    d = {"leaf": 1}
+    for i in range(depth):
+        d = {"child": d, "v": i, "l": [i, {"x": i}]}
+    return d
+
+
+def shared(depth):
+    d = {"leaf": 1}
+    for i in range(depth):
+        d = {"left": d, "right": d}
+    return d
+
+
+DOCUMENTS = [
+    ("flat: 20k records of 10 atoms", [dict(("k%d" % j, j) for j in range(10)) for i in range(20000)]),
+    (
+        "nested: 20k records with a list, a dict and a sub-dict",
+        [
+            {"id": i, "name": "n%d" % i, "tags": ["a", "b", "c"], "meta": {"x": i, "y": "z", "sub": {"k": i}}}
+            for i in range(20000)
+        ],
+    ),
+    (
+        "wide: one dict of 20k nested values",
+        dict(("k%d" % i, {"a": [i, {"b": i}], "c": {"d": i}}) for i in range(20000)),
+    ),
+    ("deep: 400 chains 50 levels deep", [chain(50) for _ in range(400)]),
+    ("shared: 16 levels, each referencing the next twice", shared(16)),
+]
+
+
+def best(func, arg, repeat=15):
+    return min(timeit.repeat(lambda: func(arg), number=1, repeat=repeat)) * 1000
+
+
+ACCESSES = [
+    ("read a key", "d['name']", "b.name"),
+    ("write a key", "d['name'] = 2", "b.name = 2"),
+    ("read a missing key", "d.get('other')", "getattr(b, 'other', None)"),
+    ("read a method", "d.keys", "b.keys"),
+]
+
+
+def attributes(number=200000):
+    names = {"d": {"name": 1}, "b": Bunch(name=1)}
+    print("%-55s %21s" % ("%dk accesses" % (number // 1000), "dict -> Bunch (ms)"))
+    for name, item, attribute in ACCESSES:
+        old, new = (
+            min(timeit.repeat(stmt, globals=names, number=number, repeat=7)) * 1000 for stmt in (item, attribute)
+        )
+        print("%-55s %7.1f -> %7.1f %4.1fx slower" % (name, old, new, new / old))
+
+
+def main():
+    gc.disable()
+    print("%-55s %21s %21s" % ("", "bunchify (ms)", "unbunchify (ms)"))
+    for name, doc in DOCUMENTS:
+        converted = bunchify(doc)
+        if name.startswith("shared"):
+            # the recursive versions copy every path through the shared dicts
+            old = best(recursive_bunchify, doc, 3), best(recursive_unbunchify, converted, 3)
+        else:
+            old = best(recursive_bunchify, doc), best(recursive_unbunchify, converted)
+        new = best(bunchify, doc), best(unbunchify, converted)
+        print(
+            "%-55s %7.1f -> %7.1f %4.1fx %7.1f -> %7.1f %4.1fx"
+            % (name, old[0], new[0], old[0] / new[0], old[1], new[1], old[1] / new[1])
+        )
+    print()
+    attributes()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,7 @@ setup(
     url="https://github.com/arcticdata/tonggong",
     license="MIT License",
     install_requires="",
+    extras_require={"numpy": ["numpy"]},
     packages=find_packages(exclude=["tests"]),
     classifiers=[
         "License :: OSI Approved :: MIT License",
@@ -1,12 +1,318 @@
+import copy
 import doctest
+import io
+import json
+import pickle
 import sys
 import unittest
 
 from tonggong import bunch
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 class BunchTestCase(unittest.TestCase):
     @unittest.skipIf(sys.version_info.minor == 11, "error info different from py3.11")
     def test(self):
         returned = doctest.testmod(bunch)
         self.assertFalse(returned.failed)
+
+
+class ConvertTestCase(unittest.TestCase):
+    def test_round_trip(self):
+        d = {"a": 1, "b": [1, {"c": (2, {"d": None})}], "e": {"f": "g"}, "h": ()}
+        b = bunch.bunchify(d)
+        self.assertEqual(None, b.b[1].c[1].d)
+        self.assertIsInstance(b.b[1].c, tuple)
+        self.assertIsInstance(b.e, bunch.Bunch)
+        self.assertEqual(d, bunch.unbunchify(b))
+        self.assertIs(type(bunch.unbunchify(b)["e"]), dict)
+
+    def test_shared_and_cycles(self):
+        shared = {"x": 1}
+        d = {"a": shared, "b": [shared, (shared,)], "l": []}
+        d["l"].append(d["l"])
+        d["t"] = (d["l"], d)
+        b = bunch.bunchify(d)
+        self.assertIs(b.a, b.b[0])
+        self.assertIs(b.a, b.b[1][0])
+        self.assertIs(b.l, b.l[0])
+        self.assertIs(b.t[0], b.l)
+        self.assertIs(b.t[1], b)
+        d = bunch.unbunchify(b)
+        self.assertIs(d["t"][1], d)
+        self.assertIs(d["a"], d["b"][1][0])
+
+    def test_deep_nesting(self):
+        def leaf(x):
+            depth = 0
+            while "leaf" not in x:
+                x, depth = x["c"] if isinstance(x, dict) else x[0], depth + 1
+            return type(x), depth
+
+        depth = sys.getrecursionlimit() * 5
+        for wrap in (lambda v: {"c": v}, lambda v: [v], lambda v: (v, 0)):
+            x = {"leaf": 1}
+            for _ in range(depth):
+                x = wrap(x)
+            self.assertEqual((bunch.Bunch, depth), leaf(bunch.bunchify(x)))
+            self.assertEqual((dict, depth), leaf(bunch.unbunchify(bunch.bunchify(x))))
+
+
+class LazyBunchTestCase(unittest.TestCase):
+    def test_methods_wrap_values(self):
+        d = {"foo": {"lol": True}, "bar": [{"baz": 1}], "hello": 42}
+        b = bunch.LazyBunch(d)
+        self.assertIs(b.get("foo"), b.foo)
+        self.assertEqual([bunch.LazyBunch, list, int], [type(v) for v in b.values()])
+        self.assertEqual(1, dict(b.items())["bar"][0].baz)
+        self.assertTrue(b.setdefault("foo").lol)
+        self.assertTrue(bunch.LazyBunch(d).pop("foo").lol)
+        self.assertEqual(("hello", 42), bunch.LazyBunch(d).popitem())
+        self.assertIs(d, b.toDict())
+
+    def test_method_names_are_not_keys(self):
+        b = bunch.LazyBunch({"a": 1})
+        self.assertIsNone(b.get("values"))
+        self.assertEqual(5, b.get("keys", 5))
+        self.assertIsNone(b.pop("copy", None))
+        with self.assertRaises(KeyError):
+            b.pop("copy")
+        self.assertEqual(1, b.setdefault("items", 1))
+        self.assertEqual(1, b["items"])
+        self.assertEqual({"a": 1, "items": 1}, b.toDict())
+
+
+class FrozenBunchTestCase(unittest.TestCase):
+    def test_freeze(self):
+        f = bunch.FrozenBunch({"db": {"ports": [5432, 5433], "tags": {"a"}}}, debug=False)
+        self.assertIsInstance(f.db, bunch.FrozenBunch)
+        self.assertEqual((5432, 5433), f.db.ports)
+        self.assertEqual(frozenset({"a"}), f.db.tags)
+        self.assertEqual({"db": {"ports": [5432, 5433], "tags": {"a"}}, "debug": False}, f.toDict())
+        self.assertIs(f.db, bunch.FrozenBunch(db=f.db).db)
+
+    def test_hash(self):
+        f = bunch.FrozenBunch(a=1, b={"c": [2]})
+        self.assertEqual(hash(f), hash(bunch.FrozenBunch(b={"c": (2,)}, a=1)))
+        self.assertEqual("cached", {f: "cached"}[bunch.FrozenBunch(f)])
+        with self.assertRaises(TypeError):
+            hash(bunch.FrozenBunch(a=bytearray()))
+
+    def test_immutable(self):
+        f = bunch.FrozenBunch(a=1)
+        expected = hash(f)
+        for mutate in [
+            lambda: f.__setitem__("a", 2),
+            lambda: f.__delitem__("a"),
+            lambda: f.update(a=2),
+            lambda: f.pop("a"),
+            lambda: f.popitem(),
+            lambda: f.setdefault("b", 2),
+            lambda: f.clear(),
+        ]:
+            with self.assertRaises(TypeError):
+                mutate()
+        with self.assertRaises(TypeError):
+            f |= {"a": 2}
+        with self.assertRaises(AttributeError):
+            f.a = 2
+        with self.assertRaises(AttributeError):
+            del f.a
+        f.__init__(a=5)
+        f.__init__({"b": 6})
+        self.assertEqual({"a": 1}, f)
+        self.assertEqual(expected, hash(f))
+
+    def test_pickle(self):
+        f = bunch.FrozenBunch(a=1, b={"c": [2]})
+        for g in (pickle.loads(pickle.dumps(f)), copy.copy(f), copy.deepcopy(f)):
+            self.assertIsInstance(g, bunch.FrozenBunch)
+            self.assertIsInstance(g.b, bunch.FrozenBunch)
+            self.assertEqual(f, g)
+            self.assertEqual(hash(f), hash(g))
+
+
+class IterJsonTestCase(unittest.TestCase):
+    def read(self, text, chunk_size, binary=False):
+        fp = io.BytesIO(text.encode("utf-8")) if binary else io.StringIO(text)
+        return list(bunch.iter_json(fp, chunk_size=chunk_size))
+
+    def test_chunk_boundaries(self):
+        records = [{"id": 12345, "name": 'café 中文 "q" \\', "v": [1.5e-3, -2, True, None]}, {"a": {"b": []}}, 7]
+        array = json.dumps(records)
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        for text in (array, " \n" + array.replace(", ", " ,\n ") + "\n", lines):
+            for chunk_size in range(1, len(text) + 2):
+                for binary in (False, True):
+                    result = self.read(text, chunk_size, binary)
+                    self.assertEqual(records, result, (text, chunk_size, binary))
+                    self.assertIsInstance(result[0], bunch.Bunch)
+                    self.assertIsInstance(result[1].a, bunch.Bunch)
+
+    def test_split_numbers(self):
+        for text in ("[1234567, -0.5e+10, 3]", "1234567\n-0.5e+10\n3", "1234567 -0.5e+10 3"):
+            for chunk_size in range(1, 8):
+                self.assertEqual([1234567, -0.5e10, 3], self.read(text, chunk_size))
+
+    def test_split_characters(self):
+        # multi-byte UTF-8 sequences and \u escapes, including a surrogate pair
+        text = '["é中\U0001f600", "\\u00e9\\ud83d\\ude00"]'
+        for chunk_size in range(1, len(text.encode("utf-8")) + 1):
+            for binary in (False, True):
+                self.assertEqual(["é中\U0001f600", "é\U0001f600"], self.read(text, chunk_size, binary))
+
+    def test_empty(self):
+        for text in ("", " \n", "[]", " [ ] "):
+            for chunk_size in (1, 2, 64):
+                self.assertEqual([], self.read(text, chunk_size))
+
+    def test_error_positions(self):
+        cases = [
+            ("[1 2]", "Expecting ',' delimiter", 1, 4, 3),
+            ("[1,\n2,]", "Expecting value", 2, 3, 6),
+            ('[{"a": 1},\n {"a": 2}\n {"a": 3}]', "Expecting ',' delimiter", 3, 2, 22),
+            ('{"a": 1}\n{"a": }\n', "Expecting value", 2, 7, 15),
+            ("[1] 2", "Extra data", 1, 5, 4),
+            ('["abc', "Unterminated string starting at", 1, 2, 1),
+            ("[1,", "Expecting value", 1, 4, 3),
+        ]
+        for text, msg, lineno, colno, pos in cases:
+            for chunk_size in (1, 2, 3, 5, 1 << 16):
+                with self.assertRaises(json.JSONDecodeError) as raised:
+                    self.read(text, chunk_size)
+                error = raised.exception
+                self.assertEqual((msg, lineno, colno, pos), (error.msg, error.lineno, error.colno, error.pos), text)
+                self.assertEqual("%s: line %d column %d (char %d)" % (msg, lineno, colno, pos), str(error))
+
+    def test_stops_at_error(self):
+        class Stream(io.StringIO):
+            reads = 0
+
+            def read(self, size=-1):
+                self.reads += size != 0
+                return super().read(size)
+
+        fp = Stream("[1, 2 3" + ", 4" * 100000 + "]")
+        with self.assertRaises(json.JSONDecodeError):
+            list(bunch.iter_json(fp, chunk_size=64))
+        self.assertLess(fp.reads, 5)
+
+
+class BunchTableTestCase(unittest.TestCase):
+    def setUp(self):
+        self.table = bunch.BunchTable.from_records(
+            [{"name": "a", "price": 1.5}, {"name": "b", "price": 2.0}], typecodes={"price": "d"}
+        )
+
+    def test_rows(self):
+        t = self.table
+        self.assertEqual(("name", "price"), t.keys)
+        self.assertEqual(2, len(t))
+        self.assertEqual("b", t[1].name)
+        self.assertEqual("a", t[-2]["name"])
+        self.assertEqual({"name": "b", "price": 2.0}, t[True].toDict())
+        t[0].price = 3.0
+        t[1]["name"] = "c"
+        self.assertEqual([{"name": "a", "price": 3.0}, {"name": "c", "price": 2.0}], t.to_records())
+        self.assertEqual(["a", "c"], [row.name for row in t])
+        with self.assertRaises(AttributeError):
+            t[0].other
+        with self.assertRaises(IndexError):
+            t[2]
+        with self.assertRaises(IndexError):
+            t[-3]
+        for index in ("0", 0.0, slice(0, 1), None):
+            with self.assertRaises(TypeError):
+                t[index]
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy_indices(self):
+        for index in (numpy.int64(1), numpy.uint8(1), numpy.array(1)):
+            self.assertEqual("b", self.table[index].name)
+
+    def test_extend_is_atomic(self):
+        t = self.table
+        for records in (
+            [{"name": "c", "price": 1.0}, {"name": "d"}],
+            [{"name": "c", "price": 1.0}, {"name": "d", "price": "free"}],
+            [{"name": "c", "price": 1.0}, {"name": "d", "price": 1.0, "extra": 1}],
+        ):
+            with self.assertRaises((TypeError, ValueError)):
+                t.extend(records)
+            self.assertEqual((2, 2, 2), (len(t), len(t.column("name")), len(t.column("price"))))
+        t.extend(iter([{"price": 4.0, "name": "c"}]))
+        self.assertEqual(4.0, t[2].price)
+        self.assertEqual(0, len(bunch.BunchTable.from_records([])))
+
+
+class ChainBunchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.defaults = bunch.Bunch.fromDict(
+            {"debug": False, "db": {"host": "localhost", "port": 5432, "opts": {"ssl": False}}}
+        )
+        self.tenant = {"db": {"host": "tenant.db"}}
+
+    def test_lookup(self):
+        cfg = bunch.ChainBunch({}, self.tenant, self.defaults)
+        self.assertEqual(("tenant.db", 5432, False), (cfg.db.host, cfg.db.port, cfg.debug))
+        self.assertIsInstance(cfg.db, bunch.ChainBunch)
+        self.assertIs(cfg["db"]["opts"].ssl, False)
+        with self.assertRaises(AttributeError):
+            cfg.missing
+        with self.assertRaises(KeyError):
+            cfg.db["missing"]
+
+    def test_copy_on_write(self):
+        cfg = bunch.ChainBunch({}, self.tenant, self.defaults)
+        cfg.db.opts.ssl = True
+        self.assertEqual({"db": {"opts": {"ssl": True}}}, cfg.maps[0])
+        self.assertEqual({"ssl": False}, self.defaults.db.opts)
+        self.assertEqual({"db": {"host": "tenant.db"}}, self.tenant)
+        self.assertEqual(
+            {"debug": False, "db": {"host": "tenant.db", "port": 5432, "opts": {"ssl": True}}}, cfg.toDict()
+        )
+
+    def test_views_of_one_node(self):
+        cfg = bunch.ChainBunch({}, self.tenant, self.defaults)
+        first, second = cfg.db, cfg.db
+        first.port = 6432
+        second.host = "other.db"
+        first.opts.ssl = True
+        second.opts.timeout = 5
+        self.assertEqual({"db": {"port": 6432, "host": "other.db", "opts": {"ssl": True, "timeout": 5}}}, cfg.maps[0])
+        self.assertEqual(("other.db", 6432, True, 5), (first.host, second.port, second.opts.ssl, first.opts.timeout))
+        self.assertEqual(("other.db", 6432), (cfg.db.host, cfg.db.port))
+        del second.port
+        self.assertEqual(5432, first.port)
+
+    def test_new_child(self):
+        cfg = bunch.ChainBunch({}, self.tenant, self.defaults)
+        cfg.db.port = 6432
+        request = cfg.new_child()
+        self.assertIsInstance(request, bunch.ChainBunch)
+        request.debug = True
+        request.db.opts.ssl = True
+        request.db.host = "request.db"
+        self.assertEqual({"debug": True, "db": {"opts": {"ssl": True}, "host": "request.db"}}, request.maps[0])
+        self.assertEqual({"db": {"port": 6432}}, cfg.maps[0])
+        self.assertEqual(
+            (True, "request.db", 6432, True), (request.debug, request.db.host, request.db.port, request.db.opts.ssl)
+        )
+        self.assertEqual((False, "tenant.db", 6432, False), (cfg.debug, cfg.db.host, cfg.db.port, cfg.db.opts.ssl))
+        self.assertEqual(
+            {"debug": True, "db": {"host": "request.db", "port": 6432, "opts": {"ssl": True}}}, request.toDict()
+        )
+        with self.assertRaises(AttributeError):
+            del request.db.port
+
+    def test_pickle(self):
+        cfg = bunch.ChainBunch({}, self.tenant, self.defaults)
+        cfg.db.port = 6432
+        copied = pickle.loads(pickle.dumps(cfg))
+        self.assertEqual(cfg.toDict(), copied.toDict())
+        copied.db.port = 1
+        self.assertEqual(6432, cfg.db.port)
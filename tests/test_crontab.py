@@ -1,6 +1,36 @@
+import asyncio
+import math
+import os
+import pickle
+import subprocess
+import sys
 import unittest
+from datetime import datetime, timedelta, timezone
 
-from tonggong.crontab import CronTab
+from tonggong import crontab
+from tonggong.crontab import (
+    OVERLAP_PARALLEL,
+    OVERLAP_QUEUE,
+    OVERLAP_SKIP,
+    CronCursor,
+    CronRunner,
+    CronScheduler,
+    CronTab,
+    CronTimingWheel,
+    _increments,
+    analyze_load,
+    next_many,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
 
 
 class CrontabTestCase(unittest.TestCase):
@@ -17,3 +47,444 @@ class CrontabTestCase(unittest.TestCase):
             except Exception:
                 length -= 1
         self.assertFalse(length)
+
+    def test_next(self):
+        now = datetime(2021, 3, 5, 10, 11, 12)
+        test_cases = [
+            ("0 0 29 2 *", datetime(2024, 2, 29)),
+            ("*/7 * 31 * *", datetime(2021, 3, 31)),
+            ("*/5 * * * *", datetime(2021, 3, 5, 10, 15)),
+            ("0 0 * * l5", datetime(2021, 3, 26)),
+            ("0 0 L * *", datetime(2021, 3, 31)),
+            ("30 */2 * * * * 2022", datetime(2022, 1, 1, 0, 0, 30)),
+        ]
+        for case, expected in test_cases:
+            actual = CronTab(case).next(now, delta=False, default_utc=False)
+            self.assertEqual((expected - datetime(1970, 1, 1)).total_seconds(), actual)
+        self.assertIsNone(CronTab("0 0 1 1 * 2020").next(now, default_utc=False))
+
+    def test_previous(self):
+        now = datetime(2021, 3, 1, 12)
+        test_cases = [
+            ("0 0 L * *", datetime(2021, 2, 28)),
+            ("0 0 29 2 *", datetime(2020, 2, 29)),
+            ("0 0 0 * * * 2020", datetime(2020, 12, 31)),
+            ("0 0 * * l5", datetime(2021, 2, 26)),
+        ]
+        for case, expected in test_cases:
+            actual = CronTab(case).previous(now, delta=False, default_utc=False)
+            self.assertEqual((expected - datetime(1970, 1, 1)).total_seconds(), actual)
+        self.assertIsNone(CronTab("0 0 1 1 * 2022").previous(now, default_utc=False))
+
+    def test_next_same_as_stepping(self):
+        now = datetime(2021, 3, 5, 10, 11, 12, 500)
+        test_cases = ["0 0 29 2 *", "*/7 * 31 * *", "15 3 l * *", "0 12 * * l1-3", "0 0 ? jan-mar sat-sun", "@weekly"]
+        for case in test_cases:
+            ct = CronTab(case)
+            expected = ct.next(now, increments=list(_increments), default_utc=False)
+            self.assertEqual(expected, ct.next(now, default_utc=False))
+
+    def test_iter(self):
+        start, end = datetime(2021, 3, 5, 10, 11, 12), datetime(2021, 4, 30)
+        for case in ["*/7 * 31 * *", "0 0 * * l5", "0 */6 * * *", "0 0 1 1 * 2020"]:
+            ct = CronTab(case)
+            expected, now = [], start
+            while True:
+                delay = ct.next(now, default_utc=False)
+                if delay is None or now + timedelta(seconds=delay) > end:
+                    break
+                now += timedelta(seconds=delay)
+                expected.append(now)
+            self.assertEqual(expected, list(ct.iter(start, end)))
+            self.assertEqual(expected[::-1], list(ct.iter(end + timedelta(seconds=1), start, reverse=True)))
+
+        tz = timezone(timedelta(hours=8))
+        fires = CronTab("0 0 * * *").iter(datetime(2021, 3, 5, 10, tzinfo=tz))
+        self.assertEqual(datetime(2021, 3, 6, tzinfo=tz), next(fires))
+        self.assertEqual(datetime(2021, 3, 7, tzinfo=tz), next(fires))
+
+    def test_lazy_imports(self):
+        code = (
+            "import sys, tonggong.crontab; print(sorted({'numpy', 'asyncio', 'concurrent.futures'} & set(sys.modules)))"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual("[]", output.strip())
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_test_many(self):
+        start = int((datetime(2020, 1, 1) - datetime(1970, 1, 1)).total_seconds())
+        seconds = numpy.arange(start, start + 366 * 86400, 900)
+        for case in ["*/5 * * * *", "0 12 l * *", "0 * * * l5", "0 30 */2 * * l0-2 2020", "0 0 * * 1-5"]:
+            ct = CronTab(case)
+            expected = [ct.test(int(s)) for s in seconds]
+            self.assertEqual(expected, ct.test_many(seconds).tolist())
+            self.assertEqual(expected, ct.test_many(seconds.astype("datetime64[s]")).tolist())
+
+    def test_scheduler(self):
+        now = datetime(2021, 3, 5, 10, 11, 12)
+        scheduler = CronScheduler()
+        scheduler.add("five", "*/5 * * * *", now)
+        scheduler.add("hourly", CronTab("@hourly"), now)
+        scheduler.add("gone", "0 0 1 1 * 2020", now)
+        scheduler.add("removed", "* * * * *", now)
+        scheduler.remove("removed")
+        self.assertEqual(2, len(scheduler))
+        self.assertNotIn("gone", scheduler)
+        self.assertEqual((datetime(2021, 3, 5, 10, 15), "five"), scheduler.peek())
+
+        self.assertEqual([], scheduler.pop_due(datetime(2021, 3, 5, 10, 14, 59)))
+        due = scheduler.pop_due(datetime(2021, 3, 5, 11))
+        expected = [(datetime(2021, 3, 5, 10, minute), "five") for minute in range(15, 60, 5)]
+        expected += [(datetime(2021, 3, 5, 11), "five"), (datetime(2021, 3, 5, 11), "hourly")]
+        self.assertEqual(expected, due)
+        self.assertEqual((datetime(2021, 3, 5, 11, 5), "five"), scheduler.peek())
+
+        scheduler.reschedule("five", "0 0 * * *", datetime(2021, 3, 5, 11))
+        self.assertEqual((datetime(2021, 3, 5, 12), "hourly"), scheduler.peek())
+        scheduler.remove("hourly")
+        self.assertEqual([(datetime(2021, 3, 6), "five")], scheduler.pop_due(datetime(2021, 3, 6)))
+        self.assertRaises(KeyError, scheduler.remove, "hourly")
+
+    def test_cache(self):
+        crontab.set_cache_size(2)
+        try:
+            daily = CronTab("@daily")
+            self.assertIs(daily.matchers, CronTab("0 0 * * *").matchers)
+            self.assertIs(daily.matchers, CronTab("0 0 * * * *").matchers)
+            self.assertIs(daily.matchers, CronTab("0 0 0 * * * *").matchers)
+            self.assertEqual((3, 1, 2, 1), tuple(crontab.cache_info()))
+
+            CronTab("*/5 * * * *")
+            CronTab("*/7 * * * *")
+            self.assertIsNot(daily.matchers, CronTab("@daily").matchers)
+            self.assertEqual((3, 4, 2, 2), tuple(crontab.cache_info()))
+
+            crontab.clear_cache()
+            self.assertEqual((0, 0, 2, 0), tuple(crontab.cache_info()))
+        finally:
+            crontab.set_cache_size(1024)
+
+    def test_test(self):
+        test_cases = [
+            ("0 0 l * *", datetime(2024, 2, 29), True),
+            ("0 0 l * *", datetime(2023, 2, 28), True),
+            ("0 0 l * *", datetime(2024, 2, 28), False),
+            ("0 0 * * l5", datetime(2021, 3, 26), True),
+            ("0 0 * * l5", datetime(2021, 3, 19), False),
+            ("0 0 * * l0-2", datetime(2021, 3, 28), True),
+            ("0 0 * * l0-2", datetime(2021, 3, 31), False),
+            ("0 0 l * l3", datetime(2021, 3, 31), True),
+        ]
+        for case, dt, expected in test_cases:
+            self.assertEqual(expected, CronTab(case).test(dt))
+
+    def test_count(self):
+        start, end = datetime(2021, 3, 5, 10, 11, 12), datetime(2021, 6, 30, 12)
+        for case in ["*/7 * 31 * *", "0 0 * * l5", "0 */6 * * *", "0 */10 9-17 * * 1-5 *", "0 0 1 1 * 2020"]:
+            ct = CronTab(case)
+            self.assertEqual(len(list(ct.iter(start, end))), ct.count(start, end))
+        per_second = CronTab("* * * * * * *")
+        self.assertEqual(
+            365 * 86400, per_second.count(datetime(2020, 12, 31, 23, 59, 59), datetime(2021, 12, 31, 23, 59, 59))
+        )
+        self.assertEqual(0, per_second.count(end, start))
+
+    @unittest.skipIf(ZoneInfo is None, "zoneinfo requires Python 3.9")
+    def test_count_timezone(self):
+        # 2021-03-28 is an hour short in Berlin and 2021-10-31 an hour long
+        berlin = ZoneInfo("Europe/Berlin")
+        for start, end in [
+            (datetime(2021, 3, 27), datetime(2021, 3, 29)),
+            (datetime(2021, 10, 30), datetime(2021, 11, 1)),
+        ]:
+            start, end = start.replace(tzinfo=berlin), end.replace(tzinfo=berlin)
+            for case in ["30 2 * * *", "*/15 * * * *", "0 0 * * *"]:
+                ct = CronTab(case)
+                self.assertEqual(len(list(ct.iter(start, end))), ct.count(start, end))
+                self.assertEqual(ct.count(start, end), ct.count(start, end.replace(tzinfo=None)))
+        self.assertEqual(1, CronTab("30 2 * * *").count(datetime(2021, 3, 27, tzinfo=berlin), datetime(2021, 3, 29)))
+        self.assertEqual(
+            188, CronTab("*/15 * * * *").count(datetime(2021, 3, 27, tzinfo=berlin), datetime(2021, 3, 29))
+        )
+
+    def test_runner(self):
+        start, calls, fired = datetime(2021, 1, 1, 12), [], []
+
+        def clock():
+            # every reading moves the clock 499ms on, so the runner only waits a few milliseconds per tick
+            calls.append(start + len(calls) * timedelta(milliseconds=499))
+            return calls[-1]
+
+        async def job():
+            fired.append(calls[-1].replace(microsecond=0))
+            if len(fired) % 3 == 0:
+                runner.stop()
+
+        # built outside the loop that runs it
+        runner = CronRunner(clock=clock)
+        runner.add("second", "* * * * * * *", job)
+        asyncio.run(runner.run())
+        self.assertEqual([start + timedelta(seconds=i) for i in (1, 2, 3)], fired)
+
+        # a stop() before run() makes the next run() return at once, and only that one
+        runner.stop()
+        asyncio.run(runner.run())
+        self.assertEqual(3, len(fired))
+        asyncio.run(runner.run())
+        self.assertEqual(6, len(fired))
+
+    def test_runner_overlap(self):
+        async def main(overlap, concurrency=None):
+            started, release = [], asyncio.Event()
+
+            async def job():
+                started.append(None)
+                await release.wait()
+
+            runner = CronRunner(concurrency=concurrency, overlap=overlap)
+            runner.add("a", "@daily", job)
+            runner.add("b", "@daily", job)
+            for _ in range(3):
+                runner._fire("a")
+            runner._fire("b")
+            await asyncio.sleep(0)
+            running = len(started)
+            release.set()
+            while runner._tasks:
+                await asyncio.gather(*runner._tasks)
+                await asyncio.sleep(0)
+            return running, len(started)
+
+        self.assertEqual((2, 2), asyncio.run(main(OVERLAP_SKIP)))
+        self.assertEqual((2, 4), asyncio.run(main(OVERLAP_QUEUE)))
+        self.assertEqual((4, 4), asyncio.run(main(OVERLAP_PARALLEL)))
+        self.assertEqual((1, 4), asyncio.run(main(OVERLAP_PARALLEL, concurrency=1)))
+
+    def test_timing_wheel(self):
+        start = datetime(2021, 2, 28, 22, 58, 5)
+        cases = [
+            "*/7 * * * * * *",
+            "0 */5 * * * * *",
+            "0 0 * * * * *",
+            "30 0 0 * * * *",
+            "0 0 0 1 * * *",
+            "0 0 0 1 1 * 2020",
+        ]
+        wheel, scheduler = CronTimingWheel(start), CronScheduler()
+        for key, case in enumerate(cases * 3):
+            wheel.add(key, case)
+            scheduler.add(key, case, start)
+        wheel.remove(0)
+        scheduler.remove(0)
+        self.assertEqual(len(scheduler), len(wheel))
+
+        now = start
+        for step in [1, 1, 5, 59, 600, 3600, 7200, 1, 86400]:
+            now += timedelta(seconds=step)
+            self.assertEqual(sorted(scheduler.pop_due(now)), sorted(wheel.advance(now)))
+        self.assertIn(4, wheel)
+        self.assertNotIn(5, wheel)
+
+        # seconds where no slot expires or cascades are skipped, so a year
+        # of sparse or no entries takes a few hundred steps, not 31 million
+        wheel, scheduler = CronTimingWheel(now), CronScheduler()
+        self.assertEqual([], wheel.advance(now + timedelta(days=365)))
+        now += timedelta(days=365)
+        for key, case in enumerate(["0 0 12 * * * *", "0 0 0 1 * * *", "30 15 10 * * 1 *", "0 0 0 1 1 * 2020"]):
+            wheel.add(key, case)
+            scheduler.add(key, case, now)
+        for step in [1, 86399, 3600, 40 * 86400, 365 * 86400]:
+            now += timedelta(seconds=step)
+            self.assertEqual(sorted(scheduler.pop_due(now)), sorted(wheel.advance(now)))
+
+    def test_pickle(self):
+        for case in ["*/5 * * * 1-5", "0 0 l * *", "0 0 * * l5,l1-2", "0 0 1 1 * 2020-2030"]:
+            ct = CronTab(case)
+            copied = pickle.loads(pickle.dumps(ct))
+            for matcher, other in zip(ct.matchers, copied.matchers):
+                self.assertEqual(matcher.mask, other.mask)
+                self.assertEqual(matcher.last, other.last)
+                self.assertEqual(matcher.allowed, other.allowed)
+            self.assertEqual(
+                list(ct.iter(datetime(2021, 3, 5), datetime(2021, 4, 5))),
+                list(copied.iter(datetime(2021, 3, 5), datetime(2021, 4, 5))),
+            )
+
+    def test_to_bytes(self):
+        for case in ["*/5 * * * 1-5", "0 0 l * *", "0 0 * * l5,l1-2", "5-10/5 1 1 1 * 2020-2030", "H H * * *"]:
+            ct = CronTab(case, seed="job")
+            data = ct.to_bytes()
+            self.assertEqual(47, len(data))
+            copied = CronTab.from_bytes(data)
+            self.assertEqual(data, copied.to_bytes())
+            self.assertEqual(data, CronTab(" ".join(m.input for m in copied.matchers)).to_bytes())
+            self.assertEqual(
+                list(ct.iter(datetime(2021, 3, 5), datetime(2021, 4, 5))),
+                list(copied.iter(datetime(2021, 3, 5), datetime(2021, 4, 5))),
+            )
+        self.assertIs(CronTab.from_bytes(data).matchers, CronTab.from_bytes(data).matchers)
+        self.assertEqual("5,10", CronTab.from_bytes(CronTab("5-10/5 * * * *").to_bytes()).matchers.minute.input)
+        for data in [b"", b"\x00" * 47, b"\xff" * 47]:
+            self.assertRaises(ValueError, CronTab.from_bytes, data)
+
+    def test_period(self):
+        self.assertEqual((300, 0), CronTab("*/5 * * * *").period)
+        self.assertEqual((7200, 0), CronTab("0 */2 * * *").period)
+        self.assertEqual((30, 0), CronTab("*/30 * * * * * *").period)
+        self.assertEqual((43200, 3600), CronTab("0 1,13 * * *").period)
+        self.assertEqual((86400, 0), CronTab("@daily").period)
+        for case in ["*/7 * * * *", "0 0 * * 1", "0 0 l * *", "0 0 * * * 2021", "0 1,14 * * *"]:
+            self.assertIsNone(CronTab(case).period)
+
+        for case in ["*/5 * * * *", "3 */15 * * * * *", "0 1,13 * * *"]:
+            ct, general = CronTab(case), CronTab(case)
+            general.period = None
+            for now in [
+                datetime(2021, 3, 5, 10, 11, 12),
+                datetime(2021, 12, 31, 23, 59, 59),
+                datetime(2099, 12, 31, 23),
+            ]:
+                for delta in [timedelta(0), timedelta(seconds=1), timedelta(microseconds=1), timedelta(days=-1)]:
+                    dt = now + delta
+                    self.assertEqual(general.next(dt, default_utc=False), ct.next(dt, default_utc=False))
+                    self.assertEqual(general.previous(dt, default_utc=False), ct.previous(dt, default_utc=False))
+                    self.assertEqual(general.test(dt), ct.test(dt))
+                    self.assertEqual(general.count(dt, dt + timedelta(days=3)), ct.count(dt, dt + timedelta(days=3)))
+        self.assertIsNone(CronTab("*/5 * * * *").next(datetime(2099, 12, 31, 23, 59), default_utc=False))
+        self.assertEqual(
+            288 * 365,
+            CronTab("*/5 * * * *").count(datetime(2020, 12, 31, 23, 59, 59), datetime(2021, 12, 31, 23, 59, 59)),
+        )
+
+    def test_cursor(self):
+        for case in ["*/7 * * * *", "0 0 l * *", "0 0 1 1 * 2021"]:
+            ct = CronTab(case)
+            cursor = ct.cursor()
+            now = datetime(2020, 12, 30, 23, 50)
+            for _ in range(3000):
+                fire = next(ct.iter(now), None)
+                self.assertEqual(fire, cursor.next(now))
+                now += timedelta(seconds=97)
+
+            cursor = CronCursor(case)
+            for now in range(1609372800, 1609372800 + 300000, 61):
+                fire = ct.next(datetime.utcfromtimestamp(now), delta=False, default_utc=True)
+                self.assertEqual(fire, cursor.next(now))
+            self.assertRaises(ValueError, cursor.next, 0)
+
+        cursor = CronCursor("0 0 1 1 * 2021")
+        self.assertIsNone(cursor.next(datetime(2021, 1, 1)))
+        self.assertIsNone(cursor.next(datetime(2021, 1, 2)))
+
+    @unittest.skipIf(ZoneInfo is None, "zoneinfo requires Python 3.9")
+    def test_cursor_timezone(self):
+        berlin = ZoneInfo("Europe/Berlin")
+        self.assertEqual(
+            datetime(2021, 3, 6, tzinfo=berlin), CronCursor("@daily").next(datetime(2021, 3, 5, 10, tzinfo=berlin))
+        )
+
+        # 02:30 does not exist in Berlin on 2021-03-28 and happens twice on 2021-10-31
+        ct = CronTab("30 2 * * *")
+        cursor = ct.cursor()
+        now = datetime(2021, 3, 27, 12, tzinfo=berlin)
+        fire = cursor.next(now)
+        self.assertEqual(datetime(2021, 3, 29, 0, 30, tzinfo=timezone.utc), fire)
+        self.assertEqual(ct.next(now), fire.timestamp() - now.timestamp())
+        cursor = ct.cursor()
+        now = datetime(2021, 10, 30, 12, tzinfo=berlin)
+        first = cursor.next(now)
+        second = cursor.next(first)
+        self.assertEqual(
+            [datetime(2021, 10, 31, 0, 30, tzinfo=timezone.utc), datetime(2021, 10, 31, 1, 30, tzinfo=timezone.utc)],
+            [first.astimezone(timezone.utc), second.astimezone(timezone.utc)],
+        )
+        self.assertEqual([timedelta(hours=2), timedelta(hours=1)], [first.utcoffset(), second.utcoffset()])
+
+    def test_next_many(self):
+        now = datetime(2021, 3, 5, 10, 11, 12)
+        cases = ["*/5 * * * *", "@daily", "0 0 * * *", "0 0 * * l5", "0 0 1 1 * 2020", "0 0 29 2 *"]
+        expected = [CronTab(case).next(now, delta=False, default_utc=False) for case in cases] * 5
+        cases = (cases[:-1] + [CronTab(cases[-1])]) * 5
+        for workers, chunksize in [(1, 10000), (2, 2)]:
+            fires = next_many(cases, now, workers=workers, chunksize=chunksize)
+            self.assertEqual(len(cases), len(fires))
+            for fire, value in zip(fires, expected):
+                if value is None:
+                    self.assertTrue(math.isnan(fire))
+                else:
+                    self.assertEqual(value, fire)
+
+    @unittest.skipIf(ZoneInfo is None, "zoneinfo requires Python 3.9")
+    def test_next_many_timezone(self):
+        now = datetime(2021, 3, 27, 12, tzinfo=ZoneInfo("Europe/Berlin"))
+        cases = ["30 2 * * *", "30 1 * * *", "30 2 * * 0"]
+        fires = next_many(cases, now)
+        self.assertEqual([now.timestamp() + CronTab(case).next(now) for case in cases], list(fires))
+        self.assertEqual(datetime(2021, 3, 29, 0, 30, tzinfo=timezone.utc).timestamp(), fires[0])
+
+    @unittest.skipIf(ZoneInfo is None, "zoneinfo requires Python 3.9")
+    def test_next_timezone(self):
+        berlin = ZoneInfo("Europe/Berlin")
+        test_cases = [
+            # 02:30 does not exist on 2021-03-28
+            ("30 2 * * *", datetime(2021, 3, 27, 12, tzinfo=berlin), datetime(2021, 3, 29, 0, 30)),
+            ("0 3 * * *", datetime(2021, 3, 28, 1, 59, tzinfo=berlin), datetime(2021, 3, 28, 1)),
+            # 02:00 to 03:00 happens twice on 2021-10-31
+            ("*/15 * * * *", datetime(2021, 10, 31, 2, 50, tzinfo=berlin), datetime(2021, 10, 31, 1)),
+            ("30 2 * * *", datetime(2021, 10, 31, 2, 40, tzinfo=berlin), datetime(2021, 10, 31, 1, 30)),
+            ("0 8 * * *", datetime(2021, 3, 5, 10, tzinfo=ZoneInfo("Asia/Shanghai")), datetime(2021, 3, 6)),
+            ("0 8 * * *", datetime(2021, 3, 5, 10, tzinfo=timezone(timedelta(hours=8))), datetime(2021, 3, 6)),
+        ]
+        for case, now, expected in test_cases:
+            delay = CronTab(case).next(now)
+            self.assertEqual(expected, datetime(1970, 1, 1) + timedelta(seconds=now.timestamp() + delay))
+            self.assertEqual((expected - datetime(1970, 1, 1)).total_seconds(), CronTab(case).next(now, delta=False))
+
+        now = datetime(2021, 10, 31, 2, 10, tzinfo=berlin, fold=1)
+        self.assertEqual(
+            datetime(2021, 10, 31, 1),
+            datetime(1970, 1, 1) + timedelta(seconds=CronTab("0 2 * * *").previous(now, delta=False)),
+        )
+        self.assertIsNone(CronTab("0 0 1 1 * 2020").next(now))
+
+    def test_analyze_load(self):
+        crontabs = {"hourly": "0 * * * *", "also_hourly": "@hourly", "five": "*/5 * * * *", "last": "0 0 l * *"}
+        crontabs["seconds"] = CronTab("*/20 * * * * * *")
+        start, end = datetime(2021, 2, 26, 10, 7, 30), datetime(2021, 3, 2, 5, 2)
+        for resolution in [1, 60, 3600]:
+            load = analyze_load(crontabs, start, end, resolution)
+            self.assertEqual(0, (load.start - datetime(2021, 2, 26)).total_seconds() % resolution)
+            expected = [0] * len(load.counts)
+            last = load.start + timedelta(seconds=len(load.counts) * resolution - 1)
+            for crontab in crontabs.values():
+                crontab = crontab if isinstance(crontab, CronTab) else CronTab(crontab)
+                for fire in crontab.iter(load.start - timedelta(seconds=1), last):
+                    expected[int((fire - load.start).total_seconds()) // resolution] += 1
+            self.assertEqual(expected, load.counts.tolist())
+            self.assertEqual(datetime(2021, 2, 28), load.peak_at)
+            self.assertEqual(["hourly", "also_hourly", "five", "last", "seconds"], load.colliding)
+
+        load = analyze_load(["0 0 1 1 * 2020"], start, end)
+        self.assertEqual((0, None, []), (load.peak, load.peak_at, load.colliding))
+        self.assertRaises(ValueError, analyze_load, [], start, end, 7)
+
+    def test_hash(self):
+        minutes = set()
+        for seed in range(20):
+            ct = CronTab("H/15 H(9-17) * * *", seed=seed)
+            self.assertEqual(ct.matchers, CronTab("H/15 H(9-17) * * *", seed=seed).matchers)
+            offset = min(ct.matchers.minute.allowed)
+            self.assertEqual({offset, offset + 15, offset + 30, offset + 45}, set(ct.matchers.minute.allowed))
+            self.assertEqual(1, len(ct.matchers.hour.allowed))
+            self.assertTrue(9 <= min(ct.matchers.hour.allowed) <= 17)
+            self.assertTrue(1 <= min(CronTab("H H H * *", seed=seed).matchers.day.allowed) <= 28)
+            minutes.add(offset)
+        self.assertGreater(len(minutes), 1)
+        self.assertIs(CronTab("*/5 * * * *", seed=1).matchers, CronTab("*/5 * * * *").matchers)
+
+        self.assertRaises(ValueError, CronTab, "H * * * *")
+        for case in ["H(5) * * * *", "H(30-70) * * * *", "H/61 * * * *", "Hx * * * *"]:
+            self.assertRaises(ValueError, CronTab, case, seed="job")
@@ -3,12 +3,21 @@ import signal
 import sys
 import time
 import unittest
+from datetime import datetime, timedelta
 
 import fakeredis
 
 from tonggong.generator import Generator
 from tonggong.hash import Hash
-from tonggong.redis import RedisLock, safe_delete_hash, safe_delete_list, safe_delete_set, safe_delete_sorted_set
+from tonggong.redis import (
+    CronClaim,
+    CronJobStore,
+    RedisLock,
+    safe_delete_hash,
+    safe_delete_list,
+    safe_delete_set,
+    safe_delete_sorted_set,
+)
 
 
 class RedisTestCase(unittest.TestCase):
@@ -97,3 +106,64 @@ class RedisTestCase(unittest.TestCase):
 
         with RedisLock(self.conn, lock_key, timeout=100) as two:
             self.assertTrue(two.acquired)
+
+    def test_cron_claim(self):
+        job_id = Generator.uuid4()
+        one = CronClaim(self.conn, job_id, "*/5 * * * *")
+        two = CronClaim(self.conn, job_id, "*/5 * * * *")
+        fire = datetime(2021, 3, 5, 10, 15)
+        self.assertTrue(one.claim(fire))
+        self.assertFalse(two.claim(fire))
+        self.assertFalse(one.claim(fire))
+        self.assertTrue(two.claim(fire + timedelta(minutes=5)))
+        self.assertTrue(0 < self.conn.pttl(CronClaim.get_key_name(job_id, fire)) <= 600 * 1000)
+
+        # 10:15 和 10:20 已被抢占，直接等待下一次触发
+        sleeps = []
+        fires = one.fires(datetime(2021, 3, 5, 10, 11), sleep=sleeps.append)
+        self.assertEqual(datetime(2021, 3, 5, 10, 25), next(fires))
+        self.assertEqual([], sleeps)
+
+    def test_cron_job_store(self):
+        name = Generator.uuid4()
+        store = CronJobStore(self.conn, name)
+        other = CronJobStore(self.conn, name)
+        now = datetime(2021, 3, 5, 10, 11)
+        self.assertTrue(store.add("five", "*/5 * * * *", now))
+        self.assertTrue(store.add("hourly", "@hourly", now))
+        self.assertTrue(store.add("once", "0 11 5 3 * 2021", now))
+        self.assertFalse(store.add("never", "0 0 1 1 * 2020", now))
+        self.assertEqual(3, len(store))
+        self.assertIn("five", other)
+        self.assertNotIn("never", other)
+        self.assertEqual("*/5 * * * *", other.get("five"))
+        self.assertEqual(datetime(2021, 3, 5, 10, 15), other.next_fire("five"))
+
+        self.assertEqual([], store.claim(now=now))
+        now = datetime(2021, 3, 5, 11, 0, 30)
+        self.assertEqual([("five", datetime(2021, 3, 5, 10, 15))], store.claim(count=1, now=now))
+        # 已领取的任务不会再被其他 worker 领取，落后多次的任务只返回一次
+        self.assertEqual(
+            [("hourly", datetime(2021, 3, 5, 11)), ("once", datetime(2021, 3, 5, 11))], sorted(other.claim(now=now))
+        )
+        self.assertEqual([], other.claim(now=now))
+        self.assertEqual(datetime(2021, 3, 5, 11, 5), store.next_fire("five"))
+        self.assertEqual(datetime(2021, 3, 5, 12), store.next_fire("hourly"))
+        self.assertNotIn("once", store)
+
+        # 租约期间被删除或替换的任务不会被写回
+        now = datetime(2021, 3, 5, 12)
+        self.assertEqual(6, len(store._claim(keys=[store.due_key, store.jobs_key], args=[now.timestamp(), 10, "1e12"])))
+        store.add("five", "0 0 * * *", now)
+        self.assertTrue(store.remove("hourly"))
+        self.assertFalse(store.remove("hourly"))
+        store._rescore(keys=[store.due_key, store.jobs_key], args=["1e12", "five", "1", "hourly", "1"])
+        self.assertEqual(datetime(2021, 3, 6), store.next_fire("five"))
+        self.assertIsNone(store.next_fire("hourly"))
+
+        # 持有租约的 worker 没有写回时，租约到期后任务可以被重新领取
+        store.add("lost", "*/5 * * * *", now)
+        lease = now + timedelta(minutes=6)
+        store._claim(keys=[store.due_key, store.jobs_key], args=[lease.timestamp(), 10, lease.timestamp()])
+        self.assertEqual([("lost", lease)], other.claim(now=lease))
+        self.assertEqual(now + timedelta(minutes=10), store.next_fire("lost"))
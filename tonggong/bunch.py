@@ -17,12 +17,18 @@
 
     It is safe to import * from this module:
 
-        __all__ = ('Bunch', 'bunchify','unbunchify')
+        __all__ = ('Bunch', 'LazyBunch', 'FrozenBunch', 'BunchTable', 'ChainBunch', 'bunchify','unbunchify', 'iter_json')
 
     un/bunchify provide dictionary conversion; Bunches can also be
     converted via Bunch.to/fromDict().
 """
+import array
+import codecs
 import json
+import operator
+import re
+from collections import ChainMap
+from collections.abc import ItemsView, Mapping, ValuesView
 
 
 class Bunch(dict):
@@ -94,6 +100,9 @@ class Bunch(dict):
         """ Gets key if it exists, otherwise throws AttributeError.
 
             nb. __getattr__ is only called if key is not found in normal places.
+            Before Python 3.12 that lookup raises an AttributeError first, so
+            reading a key as an attribute costs many times b[k]; prefer item
+            access in hot loops.
 
             >>> b = Bunch(bar='baz', lol={})
             >>> b.foo
@@ -114,13 +123,9 @@ class Bunch(dict):
             True
         """
         try:
-            # Throws exception if not in prototype chain
-            return object.__getattribute__(self, k)
-        except AttributeError:
-            try:
-                return self[k]
-            except KeyError:
-                raise AttributeError(k)
+            return self[k]
+        except KeyError:
+            raise AttributeError(k)
 
     def __setattr__(self, k, v):
         """ Sets attribute k if it exists, otherwise sets key k. A KeyError
@@ -138,16 +143,13 @@ class Bunch(dict):
                 ...
             KeyError: 'values'
         """
-        try:
-            # Throws exception if not in prototype chain
-            object.__getattribute__(self, k)
-        except AttributeError:
+        if hasattr(type(self), k):
+            object.__setattr__(self, k, v)
+        else:
             try:
                 self[k] = v
             except:
                 raise AttributeError(k)
-        else:
-            object.__setattr__(self, k, v)
 
     def __delattr__(self, k):
         """ Deletes attribute k if it exists, otherwise deletes key k. A KeyError
@@ -165,16 +167,16 @@ class Bunch(dict):
                 ...
             AttributeError: lol
         """
-        try:
-            # Throws exception if not in prototype chain
-            object.__getattribute__(self, k)
-        except AttributeError:
+        if hasattr(type(self), k):
+            try:
+                object.__delattr__(self, k)
+            except AttributeError:
+                raise AttributeError(k)
+        else:
             try:
                 del self[k]
             except KeyError:
                 raise AttributeError(k)
-        else:
-            object.__delattr__(self, k)
 
     def toDict(self):
         """ Recursively converts a bunch back into a dictionary.
@@ -224,13 +226,23 @@ class Bunch(dict):
 # more aggressive coercion to suit your own purposes.
 
 
-def bunchify(x):
+def bunchify(x, lazy=False):
     """ Recursively transforms a dictionary into a Bunch via copy.
 
         >>> b = bunchify({'urmom': {'sez': {'what': 'what'}}})
         >>> b.urmom.sez.what
         'what'
 
+        With lazy=True the dictionary is wrapped in a LazyBunch instead, which
+        converts nested values only when they are first accessed.
+
+        >>> d = {'urmom': {'sez': {'what': 'what'}}}
+        >>> b = bunchify(d, lazy=True)
+        >>> b.urmom.sez.what
+        'what'
+        >>> b.toDict() is d
+        True
+
         bunchify can handle intermediary dicts, lists and tuples (as well as
         their subclasses), but ymmv on custom datatypes.
 
@@ -241,14 +253,21 @@ def bunchify(x):
         >>> b.lol[1].hah
         'i win again'
 
+        An object referenced from several places is converted once, so the
+        copies share it too, and cycles are kept. Nesting depth is not limited
+        by the recursion limit.
+
+        >>> d = {'shared': {'lol': True}}
+        >>> d['again'], d['self'] = d['shared'], d
+        >>> b = bunchify(d)
+        >>> b.again is b.shared, b.self is b
+        (True, True)
+
         nb. As dicts are not hashable, they cannot be nested in sets/frozensets.
     """
-    if isinstance(x, dict):
-        return Bunch((k, bunchify(v)) for k, v in dict.items(x))
-    elif isinstance(x, (list, tuple)):
-        return type(x)(bunchify(v) for v in x)
-    else:
-        return x
+    if lazy:
+        return _lazy(x)
+    return _convert(x, Bunch)
 
 
 def unbunchify(x):
@@ -266,16 +285,571 @@ def unbunchify(x):
         >>> unbunchify(b) #doctest: +NORMALIZE_WHITESPACE
         {'foo': ['bar', {'lol': True}], 'hello': 42, 'ponies': ('are pretty!', {'lies': 'are trouble!'})}
 
+        Shared and cyclic references are handled as in bunchify.
+
+        >>> b = Bunch(lol=[])
+        >>> b.lol.append(b)
+        >>> d = unbunchify(b)
+        >>> type(d) is dict and d['lol'][0] is d
+        True
+
         nb. As dicts are not hashable, they cannot be nested in sets/frozensets.
     """
+    return _convert(x, dict)
+
+
+# values that are returned as they are, checked before the isinstance() tests
+_ATOMS = frozenset([str, int, float, bool, type(None)])
+
+
+def _convert(x, factory):
+    """ Copies the dicts, lists and tuples in x, turning each dict into a
+        `factory` instance. Every container goes through a memo keyed by id(),
+        so shared ones are converted once and cycles terminate.
+
+        A dict or list holding only atoms is copied at once; the others are
+        created empty when first reached and filled from an explicit stack. A
+        tuple has to be built from its converted items, so nested tuples are
+        built from a stack of partly converted tuples. A cycle always passes a
+        dict or list, which only needs to exist, not to be filled.
+    """
+    memo = {}
+    stack = []
+    only_atoms = _ATOMS.issuperset
+
+    def convert(v):
+        result = memo.get(id(v))
+        if result is not None:
+            return result
+        if isinstance(v, dict):
+            if only_atoms(map(type, dict.values(v))):
+                result = memo[id(v)] = factory(v)
+            else:
+                result = memo[id(v)] = factory()
+                stack.append((v, result))
+        elif isinstance(v, list):
+            if only_atoms(map(type, v)):
+                result = memo[id(v)] = type(v)(v)
+            else:
+                result = memo[id(v)] = type(v)()
+                stack.append((v, result))
+        elif isinstance(v, tuple):
+            result = build(v)
+        else:
+            return v
+        return result
+
+    def build(t):
+        # (tuple, its items converted so far)
+        frames = [(t, [])]
+        while True:
+            v, items = frames[-1]
+            while len(items) < len(v):
+                item = v[len(items)]
+                if item.__class__ in _ATOMS:
+                    items.append(item)
+                elif isinstance(item, tuple) and id(item) not in memo:
+                    frames.append((item, []))
+                    break
+                else:
+                    items.append(convert(item))
+            else:
+                frames.pop()
+                result = memo[id(v)] = type(v)(items)
+                if not frames:
+                    return result
+                frames[-1][1].append(result)
+
+    root = convert(x)
+    while stack:
+        v, result = stack.pop()
+        if isinstance(result, dict):
+            dict.update(result, {k: item if item.__class__ in _ATOMS else convert(item) for k, item in dict.items(v)})
+        else:
+            result.extend([item if item.__class__ in _ATOMS else convert(item) for item in v])
+    return root
+
+
+class LazyBunch(Bunch):
+    """ A Bunch view of a dictionary that converts nested values on access.
+
+        Only the top level is copied. A nested dict, list or tuple is wrapped
+        the first time it is read as an item or attribute, and the wrapped
+        value replaces it, so later reads return the same object.
+
+        >>> d = {'foo': {'lol': True}, 'bar': [{'baz': 1}], 'hello': 42}
+        >>> b = LazyBunch(d)
+        >>> dict.__getitem__(b, 'foo') is d['foo']
+        True
+        >>> b.foo.lol
+        True
+        >>> b.foo is b['foo']
+        True
+        >>> b.bar[0].baz
+        1
+
+        Dict methods that return values, such as items() and pop(), wrap them
+        in the same way.
+
+        >>> [type(v).__name__ for k, v in LazyBunch(d).items()]
+        ['LazyBunch', 'list', 'int']
+        >>> LazyBunch(d).pop('foo').lol
+        True
+
+        toDict() hands back the original objects of the subtrees that were not
+        changed, without copying them.
+
+        >>> b.toDict() is d
+        True
+        >>> b.foo.lol = False
+        >>> b.toDict()['foo'] is d['foo']
+        False
+        >>> b.toDict()['bar'] is d['bar']
+        True
+    """
+
+    __slots__ = ("_source",)
+
+    def __init__(self, source=None, **kwargs):
+        if source is None:
+            source = kwargs
+        elif kwargs:
+            source = dict(source, **kwargs)
+        dict.__init__(self, source)
+        self._source = source
+
+    def __reduce__(self):
+        return self.__class__, (self._source,), None, None, iter(dict.items(self))
+
+    def __getitem__(self, k):
+        v = dict.__getitem__(self, k)
+        if isinstance(v, (dict, list, tuple)) and not isinstance(v, Bunch) and v is self._source.get(k):
+            v = _lazy(v)
+            dict.__setitem__(self, k, v)
+        return v
+
+    def get(self, k, default=None):
+        """ >>> b = LazyBunch({'foo': {'lol': True}})
+            >>> b.get('foo') is b.foo
+            True
+            >>> b.get('bar', 42)
+            42
+        """
+        return self[k] if dict.__contains__(self, k) else default
+
+    def items(self):
+        return ItemsView(self)
+
+    def values(self):
+        return ValuesView(self)
+
+    def pop(self, k, *default):
+        if not dict.__contains__(self, k):
+            return dict.pop(self, k, *default)
+        v = self[k]
+        dict.__delitem__(self, k)
+        return v
+
+    def popitem(self):
+        if not self:
+            raise KeyError("popitem(): dictionary is empty")
+        k = next(reversed(self))
+        return k, self.pop(k)
+
+    def setdefault(self, k, default=None):
+        if not dict.__contains__(self, k):
+            self[k] = default
+        return self[k]
+
+    def toDict(self):
+        source = self._source
+        d = dict((k, _restore(v, source.get(k, _MISSING))) for k, v in dict.items(self))
+        if len(d) == len(source) and all(v is source.get(k, _MISSING) for k, v in d.items()):
+            return source
+        return d
+
+
+_MISSING = object()
+
+
+def _lazy(x):
+    if isinstance(x, dict) and not isinstance(x, Bunch):
+        return LazyBunch(x)
+    elif isinstance(x, (list, tuple)):
+        return type(x)(_lazy(v) for v in x)
+    else:
+        return x
+
+
+def _restore(x, original):
+    """ Converts a value read through a LazyBunch back, returning `original`
+        when nothing in it changed.
+    """
+    if x is original:
+        return x
+    if isinstance(x, LazyBunch):
+        return x.toDict()
+    if isinstance(x, (list, tuple)) and type(x) is type(original) and len(x) == len(original):
+        items = [_restore(v, o) for v, o in zip(x, original)]
+        if all(v is o for v, o in zip(items, original)):
+            return original
+        return type(x)(items)
+    return unbunchify(x)
+
+
+class FrozenBunch(Bunch):
+    """ An immutable, hashable Bunch, usable as a dict or cache key.
+
+        Nested values are frozen on construction: dicts become FrozenBunches,
+        lists and tuples become tuples, and sets become frozensets.
+
+        >>> f = FrozenBunch({'db': {'host': 'localhost', 'ports': [5432, 5433]}}, debug=False)
+        >>> f.db.host
+        'localhost'
+        >>> f.db.ports
+        (5432, 5433)
+        >>> f == FrozenBunch(debug=False, db=FrozenBunch(host='localhost', ports=(5432, 5433)))
+        True
+        >>> {f: 'cached'}[FrozenBunch(f)]
+        'cached'
+
+        The hash is computed on first use and then kept. It requires every
+        value to be hashable.
+
+        >>> f.debug = True
+        Traceback (most recent call last):
+            ...
+        AttributeError: FrozenBunch is immutable
+        >>> f['debug'] = True
+        Traceback (most recent call last):
+            ...
+        TypeError: FrozenBunch is immutable
+
+        toDict() thaws the copy back into dicts and lists.
+
+        >>> f.toDict()
+        {'db': {'host': 'localhost', 'ports': [5432, 5433]}, 'debug': False}
+    """
+
+    __slots__ = ("_hash",)
+
+    def __new__(cls, *args, **kwargs):
+        self = dict.__new__(cls)
+        object.__setattr__(self, "_hash", None)
+        dict.__init__(self, *args, **kwargs)
+        for k, v in dict.items(self):
+            dict.__setitem__(self, k, _freeze(v))
+        return self
+
+    def __init__(self, *args, **kwargs):
+        # filled in __new__, so that calling __init__ again changes nothing,
+        # as with frozenset
+        pass
+
+    def __hash__(self):
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(frozenset(dict.items(self))))
+        return self._hash
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("FrozenBunch is immutable")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __setattr__(self, k, v):
+        raise AttributeError("FrozenBunch is immutable")
+
+    def __delattr__(self, k):
+        raise AttributeError("FrozenBunch is immutable")
+
+    def toDict(self):
+        return _thaw(self)
+
+
+def _freeze(x):
+    if isinstance(x, FrozenBunch):
+        return x
+    elif isinstance(x, dict):
+        return FrozenBunch(x)
+    elif isinstance(x, (list, tuple)):
+        return tuple(_freeze(v) for v in x)
+    elif isinstance(x, (set, frozenset)):
+        return frozenset(x)
+    else:
+        return x
+
+
+def _thaw(x):
     if isinstance(x, dict):
-        return dict((k, unbunchify(v)) for k, v in dict.items(x))
+        return dict((k, _thaw(v)) for k, v in dict.items(x))
     elif isinstance(x, (list, tuple)):
-        return type(x)(unbunchify(v) for v in x)
+        return [_thaw(v) for v in x]
     else:
         return x
 
 
+class BunchTable(object):
+    """ A table of records that all have the same keys, stored as one list,
+        or array if a typecode is given for the key, per key instead of one
+        dict per record.
+
+        >>> t = BunchTable.from_records([{'name': 'a', 'price': 1.5}, {'name': 'b', 'price': 2.0}],
+        ...                             typecodes={'price': 'd'})
+        >>> len(t), t.keys
+        (2, ('name', 'price'))
+        >>> t.column('price')
+        array('d', [1.5, 2.0])
+
+        Rows are views with the same attribute access as a Bunch, and writes
+        go through to the columns.
+
+        >>> row = t[-1]
+        >>> row.name
+        'b'
+        >>> row
+        BunchRow(name='b', price=2.0)
+        >>> row.price = 3.0
+        >>> t.to_records()
+        [{'name': 'a', 'price': 1.5}, {'name': 'b', 'price': 3.0}]
+
+        Every record must have exactly the table's keys.
+
+        >>> t.append({'name': 'c'})
+        Traceback (most recent call last):
+            ...
+        ValueError: record keys ['name'] do not match table keys ('name', 'price')
+        >>> t.append({'name': 'c', 'price': 'free'})
+        Traceback (most recent call last):
+            ...
+        TypeError: must be real number, not str
+        >>> len(t), len(t.column('name'))
+        (2, 2)
+    """
+
+    __slots__ = ("keys", "_columns")
+
+    def __init__(self, keys, typecodes=None):
+        typecodes = typecodes or {}
+        self.keys = tuple(keys)
+        self._columns = dict((k, array.array(typecodes[k]) if k in typecodes else []) for k in self.keys)
+
+    @classmethod
+    def from_records(cls, records, keys=None, typecodes=None):
+        """ Builds a table from an iterable of mappings. The keys default to
+            those of the first record.
+        """
+        records = list(records)
+        if keys is None:
+            keys = list(records[0]) if records else ()
+        table = cls(keys, typecodes)
+        table.extend(records)
+        return table
+
+    def to_records(self):
+        return [dict(zip(self.keys, values)) for values in zip(*(self._columns[k] for k in self.keys))]
+
+    def append(self, record):
+        self.extend([record])
+
+    def extend(self, records):
+        records = list(records)
+        keys = self.keys
+        for record in records:
+            if len(record) != len(keys) or not all(k in record for k in keys):
+                raise ValueError("record keys %r do not match table keys %r" % (sorted(record), keys))
+        # build every column first, so that a value a typed column rejects
+        # leaves the table unchanged
+        values = []
+        for k in keys:
+            column = self._columns[k]
+            items = [record[k] for record in records]
+            values.append((column, array.array(column.typecode, items) if isinstance(column, array.array) else items))
+        for column, items in values:
+            column.extend(items)
+
+    def column(self, key):
+        """ Returns the list or array holding the values of `key`. """
+        return self._columns[key]
+
+    def __len__(self):
+        return len(self._columns[self.keys[0]]) if self.keys else 0
+
+    def __getitem__(self, index):
+        try:
+            index = operator.index(index)
+        except TypeError:
+            raise TypeError("BunchTable indices must be integers, not %s" % type(index).__name__) from None
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("BunchTable index out of range")
+        return BunchRow(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield BunchRow(self, index)
+
+    def __repr__(self):
+        return "%s(keys=%r, rows=%d)" % (self.__class__.__name__, self.keys, len(self))
+
+
+class BunchRow(Mapping):
+    """ A view of one row of a BunchTable. """
+
+    __slots__ = ("_table", "_index")
+
+    def __init__(self, table, index):
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_index", index)
+
+    def __getattr__(self, k):
+        try:
+            return self._table._columns[k][self._index]
+        except KeyError:
+            raise AttributeError(k)
+
+    def __setattr__(self, k, v):
+        try:
+            self[k] = v
+        except KeyError:
+            raise AttributeError(k)
+
+    def __getitem__(self, k):
+        return self._table._columns[k][self._index]
+
+    def __setitem__(self, k, v):
+        self._table._columns[k][self._index] = v
+
+    def __iter__(self):
+        return iter(self._table.keys)
+
+    def __len__(self):
+        return len(self._table.keys)
+
+    def toDict(self):
+        return dict(self)
+
+    def __repr__(self):
+        args = ", ".join(["%s=%r" % (key, self[key]) for key in sorted(self._table.keys)])
+        return "%s(%s)" % (self.__class__.__name__, args)
+
+
+class ChainBunch(ChainMap):
+    """ A ChainMap with attribute-style access, for layering configurations.
+        Lookups go through the layers in order, and a key that maps to a
+        mapping in several layers gives a ChainBunch over those mappings.
+        Writes go to the first layer only, and nested writes create just the
+        nested nodes they need there, so the other layers can be shared.
+
+        >>> defaults = Bunch.fromDict({'debug': False, 'db': {'host': 'localhost', 'port': 5432}})
+        >>> tenant = {'db': {'host': 'tenant.db'}}
+        >>> cfg = ChainBunch({}, tenant, defaults)
+        >>> cfg.db.host, cfg.db.port, cfg.debug
+        ('tenant.db', 5432, False)
+        >>> cfg.db.port = 6432
+        >>> cfg.maps[0]
+        {'db': Bunch(port=6432)}
+        >>> cfg.toDict()
+        {'debug': False, 'db': {'host': 'tenant.db', 'port': 6432}}
+        >>> defaults.db.port, tenant
+        (5432, {'db': {'host': 'tenant.db'}})
+
+        new_child() adds a layer in constant time.
+
+        >>> request = cfg.new_child()
+        >>> request.debug = True
+        >>> request.debug, cfg.debug
+        (True, False)
+        >>> del request.db.port
+        Traceback (most recent call last):
+            ...
+        AttributeError: port
+    """
+
+    def __init__(self, *maps):
+        super().__init__(*maps)
+        # (parent, key) until the first layer is inserted into the parent's, see _attach
+        self._parent = None
+
+    def __reduce__(self):
+        return self.__class__, tuple(self.maps)
+
+    def __getitem__(self, key):
+        found = []
+        for mapping in self.maps:
+            try:
+                value = mapping[key]
+            except KeyError:
+                continue
+            if value.__class__ in _ATOMS or not isinstance(value, Mapping):
+                if not found:
+                    return value
+                break
+            if not found:
+                own = mapping is self.maps[0]
+            found.append(value)
+        if not found:
+            return self.__missing__(key)
+        if own:
+            return self._view(found, None)
+        return self._view([Bunch()] + found, (self, key))
+
+    def _view(self, maps, parent):
+        # Skips __init__ and __setattr__, as a view is made on every nested lookup
+        view = object.__new__(self.__class__)
+        view.__dict__.update(maps=maps, _parent=parent)
+        return view
+
+    def __setitem__(self, key, value):
+        self._attach()
+        self.maps[0][key] = value
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def _attach(self):
+        """ Inserts the first layer of a nested ChainBunch into the first layer
+            of its parent, unless another view of the same node has already.
+        """
+        if self._parent is not None:
+            parent, key = self._parent
+            parent._attach()
+            layer = parent.maps[0].get(key)
+            if isinstance(layer, Mapping):
+                self.maps[0] = layer
+            else:
+                parent.maps[0][key] = self.maps[0]
+            self._parent = None
+
+    def __getattr__(self, k):
+        try:
+            return self[k]
+        except KeyError:
+            raise AttributeError(k)
+
+    def __setattr__(self, k, v):
+        if k in ("maps", "_parent"):
+            object.__setattr__(self, k, v)
+        else:
+            self[k] = v
+
+    def __delattr__(self, k):
+        try:
+            del self[k]
+        except KeyError:
+            raise AttributeError(k)
+
+    def toDict(self):
+        """ Recursively merges the layers into a dictionary. """
+        return dict((k, v.toDict() if isinstance(v, ChainBunch) else unbunchify(v)) for k, v in self.items())
+
+
 # JSON Serialization
 def toJSON(self, **options):
     """ Serializes this Bunch to JSON. Accepts the same keyword options as `json.dumps()`.
@@ -289,7 +863,139 @@ def toJSON(self, **options):
     return json.dumps(self, **options)
 
 
+def fromJSON(s, **options):
+    """ Deserializes JSON into Bunches in a single pass. Accepts the same keyword
+        options as `json.loads()`.
+
+        >>> b = Bunch.fromJSON('{"foo": {"lol": true}, "hello": [42, {"a": 1}]}')
+        >>> b.foo.lol, b.hello[1].a
+        (True, 1)
+    """
+    opts = dict(object_hook=Bunch)
+    opts.update(options)
+    return json.loads(s, **opts)
+
+
 Bunch.toJSON = toJSON
+Bunch.fromJSON = staticmethod(fromJSON)
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# how close to the end of the buffer a decoding error has to be to be taken
+# for a value cut off by it, e.g. a partial literal or \u escape
+_TRUNCATED = 16
+
+
+def iter_json(fp, chunk_size=1 << 16):
+    """ Yields the elements of a top-level JSON array, or the records of a JSON
+        lines file, read from `fp` as Bunches. Only the current record and one
+        chunk are held in memory. `fp` may be opened in text or binary (UTF-8) mode;
+        input starting with `[` is read as a single array.
+
+        >>> import io
+        >>> list(iter_json(io.StringIO('[{"a": 1}, {"a": {"b": 2}}]')))
+        [Bunch(a=1), Bunch(a=Bunch(b=2))]
+        >>> [b.a for b in iter_json(io.BytesIO(b'{"a": 1}\\n{"a": 2}\\n'), chunk_size=3)]
+        [1, 2]
+        >>> list(iter_json(io.StringIO('[1 2]')))
+        Traceback (most recent call last):
+            ...
+        json.decoder.JSONDecodeError: Expecting ',' delimiter: line 1 column 4 (char 3)
+
+        Errors give their position in the whole stream.
+
+        >>> list(iter_json(io.StringIO('[1,\\n2,]'), chunk_size=2))
+        Traceback (most recent call last):
+            ...
+        json.decoder.JSONDecodeError: Expecting value: line 2 column 3 (char 6)
+    """
+    decoder = json.JSONDecoder(object_hook=Bunch)
+    incremental = None if isinstance(fp.read(0), str) else codecs.getincrementaldecoder("utf-8")()
+    buf, pos, eof = "", 0, False
+    # characters, lines and characters since the last line dropped from buf
+    offset, lines, column = 0, 0, 0
+
+    def fill(size):
+        # Reads until at least `size` characters are buffered past `pos`, dropping
+        # what has already been consumed.
+        nonlocal buf, pos, eof, offset, lines, column
+        newlines = buf.count("\n", 0, pos)
+        if newlines:
+            lines += newlines
+            column = pos - buf.rfind("\n", 0, pos) - 1
+        else:
+            column += pos
+        offset += pos
+        chunks = [buf[pos:]]
+        available = len(chunks[0])
+        while not eof and available < size:
+            chunk = fp.read(chunk_size)
+            eof = not chunk
+            if incremental is not None:
+                chunk = incremental.decode(chunk, eof)
+            chunks.append(chunk)
+            available += len(chunk)
+        buf, pos = "".join(chunks), 0
+
+    def error(msg, at):
+        # A JSONDecodeError positioned in the whole stream rather than in buf
+        err = json.JSONDecodeError(msg, buf, at)
+        if err.lineno == 1:
+            err.colno += column
+        err.lineno += lines
+        err.pos += offset
+        err.args = ("%s: line %d column %d (char %d)" % (msg, err.lineno, err.colno, err.pos),)
+        return err
+
+    def peek():
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf) or eof:
+                return buf[pos : pos + 1]
+            fill(1)
+
+    def value():
+        nonlocal pos
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                # Only an error at the end of the buffer, or in a string running
+                # into it, may be fixed by reading more
+                if eof or len(buf) - e.pos > _TRUNCATED and not e.msg.startswith("Unterminated string"):
+                    raise error(e.msg, e.pos) from None
+            else:
+                # A number cut off by the end of the buffer may continue in the next chunk
+                if eof or end < len(buf) and buf[end] not in "0123456789.eE+-":
+                    pos = end
+                    return obj
+            # Doubling the window keeps re-parsing of large values linear
+            fill(2 * (len(buf) - pos))
+
+    c = peek()
+    if c != "[":
+        while c:
+            yield value()
+            c = peek()
+        return
+
+    pos += 1
+    if peek() == "]":
+        pos += 1
+    else:
+        while True:
+            yield value()
+            c = peek()
+            pos += 1
+            if c == "]":
+                break
+            if c != ",":
+                raise error("Expecting ',' delimiter", pos - 1)
+            peek()
+    if peek():
+        raise error("Extra data", pos)
+
 
 # YAML Serialization
 try:
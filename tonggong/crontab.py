@@ -9,11 +9,23 @@ http://www.gnu.org/licenses/lgpl.html
 Other licenses may be available upon request.
 """
 
+import array
+import bisect
+import calendar
+import functools
+import heapq
+import itertools
+import logging
+import struct
 import sys
 import warnings
 from collections import namedtuple
 from datetime import datetime, timedelta
 
+from tonggong.hash import Hash
+
+logger = logging.getLogger(__name__)
+
 _ranges = [
     (0, 59),
     (0, 59),
@@ -82,13 +94,6 @@ YEAR = timedelta(days=365)
 WARN_CHANGE = object()
 
 # find the next scheduled time
-def _end_of_month(dt):
-    ndt = dt + DAY
-    while dt.month == ndt.month:
-        ndt += DAY
-    return ndt.replace(day=1) - DAY
-
-
 def _month_incr(dt, m):
     odt = dt
     dt += MONTH
@@ -187,10 +192,137 @@ def _assert(condition, message, *args):
         raise ValueError(message % args)
 
 
+# bit k set <=> k is a multiple of 7 (k < 35), used to tile a 7-bit weekday
+# pattern across the days of a month
+_WEEK_TILE = sum(1 << (7 * i) for i in xrange(5))
+
+
+def _next_bit(mask, v):
+    """
+    Returns the smallest set bit position >= v in mask, or None.
+    """
+    mask >>= v
+    if not mask:
+        return None
+    return v + (mask & -mask).bit_length() - 1
+
+
+def _prev_bit(mask, v):
+    """
+    Returns the largest set bit position <= v in mask, or None.
+    """
+    if v < 0:
+        return None
+    mask &= (2 << v) - 1
+    if not mask:
+        return None
+    return mask.bit_length() - 1
+
+
+def _popcount(mask):
+    return bin(mask).count("1")
+
+
+def _bits(mask):
+    """
+    Yields the positions of the set bits of mask, lowest first.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def _progression(mask, size):
+    """
+    Returns (start, step) if the set bits of mask are start, start + step,
+    ... below size, with step dividing size, or None.
+    """
+    count = _popcount(mask)
+    if not count or size % count:
+        return None
+    step = size // count
+    start = _next_bit(mask, 0)
+    if start >= step or mask != ((1 << size) - 1) // ((1 << step) - 1) << start:
+        return None
+    return start, step
+
+
+def _full_mask(which):
+    start, end = _ranges[which]
+    return (2 << end) - (1 << start)
+
+
+_FULL_MASKS = [_full_mask(which) for which in xrange(ENTRIES)]
+
+
+def _period(m):
+    """
+    Returns (period, anchor) when the matchers fire exactly at the times
+    that are `anchor` seconds past a multiple of `period` seconds since
+    the epoch, within the years they allow, or None. That is when every
+    day matches and the times of day form an arithmetic progression.
+    """
+    for which in (DAY_OFFSET, MONTH_OFFSET, WEEK_OFFSET):
+        if m[which].mask != _FULL_MASKS[which]:
+            return None
+    if not m.year.any and m.year.mask != _FULL_MASKS[YEAR_OFFSET]:
+        return None
+    return _day_period(m.second.mask, m.minute.mask, m.hour.mask)
+
+
+@functools.lru_cache(maxsize=1024)
+def _day_period(second, minute, hour):
+    second, minute, hour = _progression(second, 60), _progression(minute, 60), _progression(hour, 24)
+    if second is None or minute is None or hour is None:
+        return None
+    if second[1] < 60:
+        if minute[1] != 1 or hour[1] != 1:
+            return None
+        return second[1], second[0]
+    if minute[1] < 60:
+        if hour[1] != 1:
+            return None
+        return 60 * minute[1], 60 * minute[0] + second[0]
+    return 3600 * hour[1], 3600 * hour[0] + 60 * minute[0] + second[0]
+
+
+def _weekday_days(wmask, first):
+    """
+    Spreads a weekday bitmask over a month whose first day falls on weekday
+    `first`, returning a bitmask of days of the month (bit 1 is the 1st).
+    """
+    rotated = ((wmask >> first) | (wmask << (7 - first))) & 0x7F
+    return (rotated * _WEEK_TILE) << 1
+
+
+@functools.lru_cache(maxsize=2048)
+def _month_range(year, month):
+    """
+    Returns the weekday of the first day of the month, counted from Sunday
+    as cron does, and the number of days in the month.
+    """
+    first, days = calendar.monthrange(year, month)
+    return (first + 1) % 7, days
+
+
+@functools.lru_cache(maxsize=4096)
+def _last_days(which, last, year, month):
+    """
+    Returns the bitmask of days of the month matched by the 'L' rules of a
+    field: the last day for the day field, or the days in the final week
+    of the month that fall on one of the `last` weekdays.
+    """
+    first, days = _month_range(year, month)
+    if which == DAY_OFFSET:
+        return 1 << days
+    return _weekday_days(last, first) & ((2 << days) - 2) & ~((1 << (days - 6)) - 1)
+
+
 class _Matcher(object):
-    __slots__ = "allowed", "end", "any", "input", "which", "split"
+    __slots__ = "allowed", "end", "any", "input", "which", "split", "mask", "last"
 
-    def __init__(self, which, entry):
+    def __init__(self, which, entry, seed=None):
         _assert(0 <= which <= YEAR_OFFSET, "improper number of cron entries specified")
         self.input = entry.lower()
         self.split = self.input.split(",")
@@ -200,40 +332,78 @@ class _Matcher(object):
         self.any = "*" in self.split or "?" in self.split
 
         for it in self.split:
-            al, en = self._parse_crontab(which, it)
+            al, en = self._parse_crontab(which, it, seed)
             if al is not None:
                 self.allowed.update(al)
             self.end = en
         _assert(self.end is not None, "improper item specification: %r", entry.lower())
         self.allowed = frozenset(self.allowed)
 
+        # Compiled forms used by CronTab.next(): `mask` has bit v set for
+        # every allowed value v. `last` is truthy for a bare 'L' in the day
+        # field, and is the bitmask of weekdays given as 'L<weekday>' in the
+        # weekday field.
+        if self.any:
+            start, end = _ranges[which]
+            self.mask = (2 << end) - (1 << start)
+        else:
+            self.mask = sum(1 << v for v in self.allowed)
+        self.last = 0
+        for it in self.split:
+            if it == "l":
+                self.last = 1
+            elif it.startswith("l"):
+                start, _, end = it[1:].partition("-")
+                for v in xrange(int(start), int(end or start) + 1):
+                    self.last |= 1 << (v % 7)
+
     def __call__(self, v, dt):
-        for i, x in enumerate(self.split):
-            if x == "l":
-                if v == _end_of_month(dt).day:
-                    return True
-
-            elif x.startswith("l"):
-                # We have to do this in here, otherwise we can end up, for
-                # example, accepting *any* Friday instead of the *last* Friday.
-                if dt.month == (dt + WEEK).month:
-                    continue
+        if self.last and _last_days(self.which, self.last, dt.year, dt.month) >> dt.day & 1:
+            return True
+        return self.any or v in self.allowed
 
-                x = x[1:]
-                if x.isdigit():
-                    x = int(x) if x != "7" else 0
-                    if v == x:
-                        return True
-                    continue
+    def _parse_hashed(self, which, entry, seed):
+        """
+        This parses the Jenkins style 'H', 'H/<step>', 'H(<start>-<end>)' and
+        'H(<start>-<end>)/<step>' items. The value, or the offset of the
+        steps, is picked by hashing the seed with the field, so that it is
+        stable for a given seed but spread out across seeds. Like Jenkins,
+        a bare 'H' in the day field stays within 1-28.
+        """
+        _assert(seed is not None, "%r needs a seed, e.g. CronTab(expr, seed=job_id)", entry)
+        _start, _end = _ranges[which]
+        start, end = _start, 28 if which == DAY_OFFSET else _end
+        rest = entry[1:]
+        if rest.startswith("("):
+            bounds, _, rest = rest[1:].partition(")")
+            start, _, end = bounds.partition("-")
+            _assert(start.isdigit() and end.isdigit(), "invalid hash range: %r", entry)
+            start, end = int(start), int(end)
+            _assert(_start <= start <= end <= _end, "hash range %r out of range [%r, %r]", entry, _start, _end)
+
+        value = int(Hash.md5("%s:%s" % (seed, which)), 16)
+        if not rest:
+            return set([start + value % (end - start + 1)])
+        _assert(rest.startswith("/") and rest[1:].isdigit(), "invalid hash specifier: %r", entry)
+        increment = int(rest[1:])
+        _assert(
+            0 < increment <= end - start + 1,
+            "increment value must be between 1 and %r, you provided %r",
+            end - start + 1,
+            increment,
+        )
+        return set(range(start + value % increment, end + 1, increment))
 
-                start, end = map(int, x.partition("-")[::2])
-                allowed = set(range(start, end + 1))
-                if 7 in allowed:
-                    allowed.add(0)
-                if v in allowed:
-                    return True
+    def __getstate__(self):
+        # the compiled form is enough to rebuild the other attributes, so
+        # unpickling does not parse the entry again
+        return self.which, self.input, self.any, self.mask, self.last
 
-        return self.any or v in self.allowed
+    def __setstate__(self, state):
+        self.which, self.input, self.any, self.mask, self.last = state
+        self.split = self.input.split(",")
+        self.end = _ranges[self.which][1]
+        self.allowed = frozenset() if self.any else frozenset(_bits(self.mask))
 
     def __lt__(self, other):
         if self.any:
@@ -253,7 +423,7 @@ class _Matcher(object):
     def __hash__(self):
         return hash((self.any, self.allowed))
 
-    def _parse_crontab(self, which, entry):
+    def _parse_crontab(self, which, entry, seed=None):
         """
         This parses a single crontab field and returns the data necessary for
         this matcher to accept the proper values.
@@ -323,6 +493,10 @@ class _Matcher(object):
                 _assert(which in (DAY_OFFSET, WEEK_OFFSET), "cannot use '?' in the %r field", _attribute[which])
             return None, _end
 
+        # hashed values, resolved from the seed
+        if entry.startswith("h"):
+            return self._parse_hashed(which, entry, seed), _end
+
         # last day of the month
         if entry == "l":
             _assert(which == DAY_OFFSET, "you can only specify a bare 'L' in the 'day' field")
@@ -365,13 +539,162 @@ class _Matcher(object):
         return good, _end
 
 
+@functools.lru_cache(maxsize=4096)
+def _zone_year(tz, year):
+    """
+    Returns the UTC offset transitions of `tz` during `year`, as a list of
+    the UTC epochs at which each period starts (the first one being the
+    start of the year) and a list of the offsets in seconds of each period.
+    The zone is sampled once a day, and changes are then narrowed down to
+    the second.
+    """
+    start = _to_tick(datetime(year, 1, 1))
+    end = _to_tick(datetime(year + 1, 1, 1))
+    fixed = tz.utcoffset(None)
+    if fixed is not None:
+        return [start], [fixed // SECOND]
+
+    def offset(utc):
+        return datetime.fromtimestamp(utc, tz).utcoffset() // SECOND
+
+    starts, offsets = [start], [offset(start)]
+    for sample in xrange(start + 86400, end + 86400, 86400):
+        sample = min(sample, end - 1)
+        current = offset(sample)
+        if current == offsets[-1]:
+            continue
+        low, high = max(sample - 86400, starts[-1]), sample
+        while high - low > 1:
+            middle = (low + high) // 2
+            if offset(middle) == current:
+                high = middle
+            else:
+                low = middle
+        starts.append(high)
+        offsets.append(current)
+    return starts, offsets
+
+
+def _zone_period(tz, utc):
+    """
+    Returns the (start, end, offset) of the period of constant UTC offset
+    of `tz` containing the UTC epoch `utc`. Periods are cut at year starts.
+    """
+    year = _from_tick(utc).year
+    starts, offsets = _zone_year(tz, year)
+    i = bisect.bisect_right(starts, utc) - 1
+    end = starts[i + 1] if i + 1 < len(starts) else _to_tick(datetime(year + 1, 1, 1))
+    return starts[i], end, offsets[i]
+
+
+# the compact form of a compiled crontab: the fields whose value is '*',
+# the second, minute, hour, day, month and weekday masks, the 'L' day
+# flag, the 'L<weekday>' mask, and the year mask starting from 1970
+_STATE = struct.Struct("<BQQIIHBBB17s")
+
+
+def _compile(crontab, seed=None):
+    if isinstance(crontab, bytes):
+        return _decode(crontab)
+    return Matcher(*[_Matcher(which, entry, seed) for which, entry in enumerate(crontab.split())])
+
+
+def _decode(data):
+    """
+    Rebuilds the matchers from CronTab.to_bytes() output. Each matcher gets
+    an equivalent canonical input, e.g. '5,10' for '5-10/5'.
+    """
+    _assert(isinstance(data, bytes) and len(data) == _STATE.size, "invalid compiled crontab: %r", data)
+    state = _STATE.unpack(data)
+    masks = list(state[1:7]) + [int.from_bytes(state[9], "little") << _ranges[YEAR_OFFSET][0]]
+    lasts = [0, 0, 0, state[7], 0, state[8], 0]
+    matchers = []
+    for which, (mask, last) in enumerate(zip(masks, lasts)):
+        start, end = _ranges[which]
+        any = bool(state[0] >> which & 1)
+        _assert(not mask >> (end + 1) and not mask & ((1 << start) - 1), "invalid compiled crontab: %r", data)
+        items = ["*"] if any else [str(v) for v in _bits(mask)]
+        if which == DAY_OFFSET and last:
+            items.append("l")
+        elif which == WEEK_OFFSET:
+            items.extend("l%d" % v for v in _bits(last))
+        _assert(items, "invalid compiled crontab: %r", data)
+        matcher = _Matcher.__new__(_Matcher)
+        matcher.__setstate__((which, ",".join(items), any, mask, last))
+        matchers.append(matcher)
+    return Matcher(*matchers)
+
+
+_compile_cached = functools.lru_cache(maxsize=1024)(_compile)
+
+
+def set_cache_size(maxsize):
+    """
+    Replaces the cache of compiled crontab expressions with an empty one
+    holding up to `maxsize` entries (None for unbounded, 0 to disable).
+    """
+    global _compile_cached
+    _compile_cached = functools.lru_cache(maxsize=maxsize)(_compile)
+
+
+def cache_info():
+    """
+    Returns the hits, misses, maxsize and currsize of the compiled
+    expression cache.
+    """
+    return _compile_cached.cache_info()
+
+
+def clear_cache():
+    _compile_cached.cache_clear()
+
+
 class CronTab(object):
-    __slots__ = ("matchers",)
+    __slots__ = "matchers", "period"
 
-    def __init__(self, crontab):
-        self.matchers = self._make_matchers(crontab)
+    def __init__(self, crontab, seed=None):
+        self.matchers = self._make_matchers(crontab, seed)
+        # (period, anchor) in seconds for purely periodic entries such as
+        # '*/5 * * * *', which next(), previous(), test() and count()
+        # answer with modular arithmetic instead of a search
+        self.period = _period(self.matchers)
+
+    def __reduce__(self):
+        return CronTab.from_bytes, (self.to_bytes(),)
 
-    def _make_matchers(self, crontab):
+    def to_bytes(self):
+        """
+        Returns the compiled state of this entry in a fixed 47 byte form,
+        one bitfield per field plus the 'L' rules, that from_bytes() turns
+        back into an equivalent CronTab without parsing.
+        """
+        m = self.matchers
+        return _STATE.pack(
+            sum(1 << which for which, matcher in enumerate(m) if matcher.any),
+            m.second.mask,
+            m.minute.mask,
+            m.hour.mask,
+            m.day.mask,
+            m.month.mask,
+            m.weekday.mask,
+            1 if m.day.last else 0,
+            m.weekday.last,
+            (m.year.mask >> _ranges[YEAR_OFFSET][0]).to_bytes(17, "little"),
+        )
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Rebuilds a CronTab from to_bytes() output. Decoded states go through
+        the same cache as parsed expressions, so equal states share one
+        compiled Matcher.
+        """
+        crontab = cls.__new__(cls)
+        crontab.matchers = _compile_cached(bytes(data))
+        crontab.period = _period(crontab.matchers)
+        return crontab
+
+    def _make_matchers(self, crontab, seed=None):
         """
         This constructs the full matcher struct.
         """
@@ -384,9 +707,13 @@ class CronTab(object):
             ct.insert(0, "0")
         _assert(len(ct) == 7, "improper number of cron entries specified; got %i need 5 to 7" % (len(ct,)))
 
-        matchers = [_Matcher(which, entry) for which, entry in enumerate(ct)]
-
-        return Matcher(*matchers)
+        # aliases and the 5, 6 and 7 field forms all normalize to the same
+        # key, and so share one compiled Matcher. The seed only matters to
+        # expressions with 'H' items.
+        ct = " ".join(ct).lower()
+        if not any(it.startswith("h") for entry in ct.split() for it in entry.split(",")):
+            seed = None
+        return _compile_cached(ct, seed)
 
     def _test_match(self, index, dt):
         """
@@ -399,32 +726,160 @@ class CronTab(object):
             attr = attr() % 7
         return self.matchers[index](attr, dt)
 
-    def next(self, now=None, increments=_increments, delta=True, default_utc=WARN_CHANGE):
+    def _month_days(self, year, month):
         """
-        How long to wait in seconds before this crontab entry can next be
-        executed.
+        Returns the bitmask of days in the given month that satisfy both the
+        day and the weekday fields, including the 'L' rules.
         """
-        if default_utc is WARN_CHANGE and (isinstance(now, _number_types) or (now and not now.tzinfo) or now is None):
-            warnings.warn(WARNING_CHANGE_MESSAGE, FutureWarning, 2)
-            default_utc = False
+        first, days = _month_range(year, month)
+        day, weekday = self.matchers.day, self.matchers.weekday
+        allowed = day.mask
+        if day.last:
+            allowed |= _last_days(DAY_OFFSET, day.last, year, month)
+        weekdays = _weekday_days(weekday.mask, first)
+        if weekday.last:
+            weekdays |= _last_days(WEEK_OFFSET, weekday.last, year, month)
+        return allowed & weekdays & ((2 << days) - 2)
+
+    def _find_next(self, dt):
+        """
+        Returns the first datetime >= dt that matches, or None. Each field
+        jumps straight to its next allowed value, resetting the fields below.
+        """
+        if self.period is not None and _ranges[YEAR_OFFSET][0] <= dt.year <= _ranges[YEAR_OFFSET][1]:
+            # periods divide a day, so the seconds of the day suffice
+            period, anchor = self.period
+            now = dt.hour * 3600 + dt.minute * 60 + dt.second
+            tick = now + (anchor - now) % period
+            if tick < 86400:
+                return datetime(dt.year, dt.month, dt.day, tick // 3600, tick // 60 % 60, tick % 60)
+            fire = datetime(dt.year, dt.month, dt.day) + timedelta(seconds=tick)
+            if fire.year <= _ranges[YEAR_OFFSET][1]:
+                return fire
+
+        m = self.matchers
+        year, month, day, hour, minute, second = dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second
+        while True:
+            if m.year.any:
+                y = year if year <= m.year.end else None
+            else:
+                y = _next_bit(m.year.mask, year)
+            if y is None:
+                return None
+            if y != year:
+                year, month, day, hour, minute, second = y, 1, 1, 0, 0, 0
+
+            v = _next_bit(m.month.mask, month)
+            if v is None:
+                year, month, day, hour, minute, second = year + 1, 1, 1, 0, 0, 0
+                continue
+            if v != month:
+                month, day, hour, minute, second = v, 1, 0, 0, 0
+
+            v = _next_bit(self._month_days(year, month), day)
+            if v is None:
+                if month == 12:
+                    year, month = year + 1, 1
+                else:
+                    month += 1
+                day, hour, minute, second = 1, 0, 0, 0
+                continue
+            if v != day:
+                day, hour, minute, second = v, 0, 0, 0
 
-        now = now or (datetime.utcnow() if default_utc and default_utc is not WARN_CHANGE else datetime.now())
-        if isinstance(now, _number_types):
-            now = datetime.utcfromtimestamp(now) if default_utc else datetime.fromtimestamp(now)
+            v = _next_bit(m.hour.mask, hour)
+            if v is None:
+                day, hour, minute, second = day + 1, 0, 0, 0
+                continue
+            if v != hour:
+                hour, minute, second = v, 0, 0
 
-        # handle timezones if the datetime object has a timezone and get a
-        # reasonable future/past start time
-        onow, now = now, now.replace(tzinfo=None)
-        tz = onow.tzinfo
-        future = now.replace(microsecond=0) + increments[0]()
-        if future < now:
-            # we are going backwards...
-            _test = lambda: future.year < self.matchers.year
-            if now.microsecond:
-                future = now.replace(microsecond=0)
-        else:
-            # we are going forwards
+            v = _next_bit(m.minute.mask, minute)
+            if v is None:
+                hour, minute, second = hour + 1, 0, 0
+                continue
+            if v != minute:
+                minute, second = v, 0
+
+            v = _next_bit(m.second.mask, second)
+            if v is None:
+                minute, second = minute + 1, 0
+                continue
+            return datetime(year, month, day, hour, minute, v)
+
+    def _find_previous(self, dt):
+        """
+        Returns the last datetime <= dt that matches, or None.
+        """
+        if self.period is not None and _ranges[YEAR_OFFSET][0] <= dt.year <= _ranges[YEAR_OFFSET][1]:
+            period, anchor = self.period
+            now = dt.hour * 3600 + dt.minute * 60 + dt.second
+            tick = now - (now - anchor) % period
+            if tick >= 0:
+                return datetime(dt.year, dt.month, dt.day, tick // 3600, tick // 60 % 60, tick % 60)
+            fire = datetime(dt.year, dt.month, dt.day) + timedelta(seconds=tick)
+            if fire.year >= _ranges[YEAR_OFFSET][0]:
+                return fire
+
+        m = self.matchers
+        year, month, day, hour, minute, second = dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second
+        while True:
+            if m.year.any:
+                y = year if year >= _ranges[YEAR_OFFSET][0] else None
+            else:
+                y = _prev_bit(m.year.mask, year)
+            if y is None:
+                return None
+            if y != year:
+                year, month, day, hour, minute, second = y, 12, 31, 23, 59, 59
+
+            v = _prev_bit(m.month.mask, month)
+            if v is None:
+                year, month, day, hour, minute, second = year - 1, 12, 31, 23, 59, 59
+                continue
+            if v != month:
+                month, day, hour, minute, second = v, 31, 23, 59, 59
+
+            v = _prev_bit(self._month_days(year, month), day)
+            if v is None:
+                if month == 1:
+                    year, month = year - 1, 12
+                else:
+                    month -= 1
+                day, hour, minute, second = 31, 23, 59, 59
+                continue
+            if v != day:
+                day, hour, minute, second = v, 23, 59, 59
+
+            v = _prev_bit(m.hour.mask, hour)
+            if v is None:
+                day, hour, minute, second = day - 1, 23, 59, 59
+                continue
+            if v != hour:
+                hour, minute, second = v, 59, 59
+
+            v = _prev_bit(m.minute.mask, minute)
+            if v is None:
+                hour, minute, second = hour - 1, 59, 59
+                continue
+            if v != minute:
+                minute, second = v, 59
+
+            v = _prev_bit(m.second.mask, second)
+            if v is None:
+                minute, second = minute - 1, 59
+                continue
+            return datetime(year, month, day, hour, minute, v)
+
+    def _step(self, future, increments, forward, now):
+        """
+        Searches by stepping with the provided `increments`, for callers that
+        pass their own increment table to next().
+        """
+        if forward:
             _test = lambda: self.matchers.year < future.year
+        else:
+            _test = lambda: future.year < self.matchers.year
 
         # Start from the year and work our way down. Any time we increment a
         # higher-magnitude value, we reset all lower-magnitude values. This
@@ -460,6 +915,43 @@ class CronTab(object):
             now,
         )
 
+        return future
+
+    def next(self, now=None, increments=_increments, delta=True, default_utc=WARN_CHANGE):
+        """
+        How long to wait in seconds before this crontab entry can next be
+        executed.
+        """
+        if default_utc is WARN_CHANGE and (isinstance(now, _number_types) or (now and not now.tzinfo) or now is None):
+            warnings.warn(WARNING_CHANGE_MESSAGE, FutureWarning, 2)
+            default_utc = False
+
+        now = now or (datetime.utcnow() if default_utc and default_utc is not WARN_CHANGE else datetime.now())
+        if isinstance(now, _number_types):
+            now = datetime.utcfromtimestamp(now) if default_utc else datetime.fromtimestamp(now)
+
+        if now.tzinfo is not None and (increments is _increments or increments is _decrements):
+            return self._next_zoned(now, increments is _increments, delta)
+
+        # handle timezones if the datetime object has a timezone and get a
+        # reasonable future/past start time
+        onow, now = now, now.replace(tzinfo=None)
+        tz = onow.tzinfo
+        future = now.replace(microsecond=0) + increments[0]()
+        forward = future >= now
+        if not forward and now.microsecond:
+            # we are going backwards...
+            future = now.replace(microsecond=0)
+
+        if increments is _increments:
+            future = self._find_next(future)
+        elif increments is _decrements:
+            future = self._find_previous(future)
+        else:
+            future = self._step(future, increments, forward, now)
+        if future is None:
+            return None
+
         if not delta:
             onow = now = datetime(1970, 1, 1)
 
@@ -473,17 +965,859 @@ class CronTab(object):
 
         return delay.days * 86400 + delay.seconds + delay.microseconds / 1000000.0
 
+    def _next_zoned(self, now, forward, delta):
+        """
+        next()/previous() for a datetime with a tzinfo. The search runs on
+        local wall-clock time within each period of constant UTC offset,
+        taken from a cached table of the zone's transitions, so a fire
+        time matches when the local time at that instant matches. Local
+        times skipped by a DST change never fire, and repeated ones fire
+        on each occurrence.
+        """
+        utcnow = now.replace(tzinfo=None) - _fix_none(now.utcoffset())
+        fire = next(self._iter_zoned(now.tzinfo, _first_tick(utcnow, forward), forward), None)
+        if fire is None:
+            return None
+
+        delay = _from_tick(fire) - (utcnow if delta else _EPOCH)
+        return delay.days * 86400 + delay.seconds + delay.microseconds / 1000000.0
+
+    def _iter_zoned(self, tz, utc, forward):
+        """
+        Yields the UTC epochs at which this crontab entry fires in `tz`, from
+        the UTC epoch `utc` (inclusive) onwards, or backwards.
+        """
+        while True:
+            start, end, offset = _zone_period(tz, utc)
+            if forward:
+                fire = self._find_next(_from_tick(utc + offset))
+            else:
+                fire = self._find_previous(_from_tick(utc + offset))
+            if fire is None:
+                return
+            fire = _to_tick(fire) - offset
+            if forward:
+                if fire >= end:
+                    utc = end
+                    continue
+                utc = fire + 1
+            else:
+                if fire < start:
+                    utc = start - 1
+                    continue
+                utc = fire - 1
+            yield fire
+
     def previous(self, now=None, delta=True, default_utc=WARN_CHANGE):
         return self.next(now, _decrements, delta, default_utc)
 
+    def iter(self, start, end=None, reverse=False):
+        """
+        Yields the successive datetimes at which this crontab entry fires
+        after `start`, or before it when `reverse` is set, stopping past
+        `end` (inclusive) if given. The search resumes from the last fire
+        time, so listing n occurrences costs n short searches. If `start`
+        has a tzinfo the yielded datetimes carry the same timezone, and fire
+        times follow its DST changes as with next().
+        """
+        if start.tzinfo is not None:
+            return self._iter_zoned_datetimes(start, end, reverse)
+        return self._iter_naive(start, end, reverse)
+
+    def _iter_zoned_datetimes(self, start, end, reverse):
+        tz = start.tzinfo
+        utc = _first_tick(start.replace(tzinfo=None) - _fix_none(start.utcoffset()), not reverse)
+        if end is not None:
+            end = _zoned_tick(end, tz)
+        for fire in self._iter_zoned(tz, utc, not reverse):
+            if end is not None and (fire < end if reverse else fire > end):
+                return
+            yield datetime.fromtimestamp(fire, tz)
+
+    def _iter_naive(self, start, end, reverse):
+        if end is not None:
+            end = end.replace(tzinfo=None)
+
+        if reverse:
+            find, step = self._find_previous, -SECOND
+            future = start.replace(microsecond=0) if start.microsecond else start - SECOND
+        else:
+            find, step = self._find_next, SECOND
+            future = start.replace(microsecond=0) + SECOND
+
+        while True:
+            future = find(future)
+            if future is None or (end is not None and (future < end if reverse else future > end)):
+                return
+            yield future
+            future += step
+
+    def count(self, start, end):
+        """
+        Returns how many times this crontab entry fires after `start` and up
+        to `end` (inclusive), i.e. the number of datetimes that
+        iter(start, end) would yield. Matching days are counted a month at a
+        time from the compiled day tables, and each day contributes the
+        product of the allowed hours, minutes and seconds. If `start` has a
+        tzinfo, the range is counted per period of constant UTC offset, so
+        DST changes are followed as in iter().
+        """
+        if start.tzinfo is not None:
+            return self._count_zoned(start, end)
+        return self._count_local(start.replace(microsecond=0) + SECOND, end.replace(tzinfo=None, microsecond=0))
+
+    def _count_zoned(self, start, end):
+        tz = start.tzinfo
+        utc = _first_tick(start.replace(tzinfo=None) - _fix_none(start.utcoffset()), True)
+        end = _zoned_tick(end, tz)
+        total = 0
+        while utc <= end:
+            _, period_end, offset = _zone_period(tz, utc)
+            last = min(period_end - 1, end)
+            total += self._count_local(_from_tick(utc + offset), _from_tick(last + offset))
+            utc = period_end
+        return total
+
+    def _count_local(self, start, end):
+        """
+        count() over naive wall-clock times from `start` to `end`, both
+        inclusive and whole seconds.
+        """
+        first, last = _ranges[YEAR_OFFSET]
+        if self.period is not None and first <= start.year and end.year <= last:
+            period, anchor = self.period
+            return max(0, (_to_tick(end) - anchor) // period - (_to_tick(start) - 1 - anchor) // period)
+        per_day = self._count_in_day(86399)
+        if start > end or not per_day:
+            return 0
+
+        month_mask = self.matchers.month.mask
+        days = 0
+        for year in xrange(start.year, end.year + 1):
+            if not self._year_allowed(year):
+                continue
+            first = start.month if year == start.year else 1
+            last = end.month if year == end.year else 12
+            for month in xrange(first, last + 1):
+                if not month_mask >> month & 1:
+                    continue
+                allowed = self._month_days(year, month)
+                if (year, month) == (start.year, start.month):
+                    allowed &= ~((1 << start.day) - 1)
+                if (year, month) == (end.year, end.month):
+                    allowed &= (2 << end.day) - 1
+                days += _popcount(allowed)
+
+        # take out the parts of the first and last days outside the range
+        total = days * per_day
+        if self._day_allowed(start):
+            total -= self._count_in_day(start.hour * 3600 + start.minute * 60 + start.second - 1)
+        if self._day_allowed(end):
+            total -= per_day - self._count_in_day(end.hour * 3600 + end.minute * 60 + end.second)
+        return total
+
+    def cursor(self):
+        """
+        Returns a CronCursor answering next fire times for a non-decreasing
+        stream of times.
+        """
+        return CronCursor(self)
+
+    def _year_allowed(self, year):
+        # the same bounds that _find_next() applies
+        if self.matchers.year.any:
+            return year <= self.matchers.year.end
+        return self.matchers.year.mask >> year & 1
+
+    def _day_allowed(self, dt):
+        return (
+            self._year_allowed(dt.year)
+            and self.matchers.month.mask >> dt.month & 1
+            and self._month_days(dt.year, dt.month) >> dt.day & 1
+        )
+
+    def _day_profile(self, resolution):
+        """
+        Returns a dict mapping buckets of `resolution` seconds within a day
+        to how many times this entry fires in them on a matching day.
+        """
+        m = self.matchers
+        profile = {}
+        for hour in _bits(m.hour.mask):
+            for minute in _bits(m.minute.mask):
+                for second in _bits(m.second.mask):
+                    bucket = (hour * 3600 + minute * 60 + second) // resolution
+                    profile[bucket] = profile.get(bucket, 0) + 1
+        return profile
+
+    def _count_in_day(self, seconds):
+        """
+        Returns how many allowed times of day fall within the first
+        `seconds` + 1 seconds of a day.
+        """
+        if seconds < 0:
+            return 0
+        m = self.matchers
+        hour, seconds = divmod(seconds, 3600)
+        minute, second = divmod(seconds, 60)
+        per_minute = _popcount(m.second.mask)
+        per_hour = _popcount(m.minute.mask) * per_minute
+        count = _popcount(m.hour.mask & ((1 << hour) - 1)) * per_hour
+        if m.hour.mask >> hour & 1:
+            count += _popcount(m.minute.mask & ((1 << minute) - 1)) * per_minute
+            if m.minute.mask >> minute & 1:
+                count += _popcount(m.second.mask & ((2 << second) - 1))
+        return count
+
     def test(self, entry):
         if isinstance(entry, _number_types):
             entry = datetime.utcfromtimestamp(entry)
+        if self.period is not None and _ranges[YEAR_OFFSET][0] <= entry.year <= _ranges[YEAR_OFFSET][1]:
+            period, anchor = self.period
+            return (entry.hour * 3600 + entry.minute * 60 + entry.second - anchor) % period == 0
         for index in xrange(ENTRIES):
             if not self._test_match(index, entry):
                 return False
         return True
 
+    def test_many(self, entries):
+        """
+        Vectorized test(): takes an array of epoch seconds (treated as UTC,
+        like test() does) or of numpy datetime64 values, and returns a
+        boolean array telling which of them match. Requires numpy.
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ValueError("test_many() requires numpy to be installed") from None
+
+        entries = numpy.asarray(entries)
+        if entries.dtype.kind == "M":
+            seconds = entries.astype("datetime64[s]").astype(numpy.int64)
+        else:
+            seconds = numpy.floor(entries).astype(numpy.int64)
+
+        days, seconds = numpy.divmod(seconds, 86400)
+        date = days.astype("datetime64[D]")
+        month_start = date.astype("datetime64[M]")
+        year_start = date.astype("datetime64[Y]")
+        year = year_start.astype(numpy.int64) + 1970
+        month = (month_start - year_start.astype("datetime64[M]")).astype(numpy.int64) + 1
+        day = (date - month_start.astype("datetime64[D]")).astype(numpy.int64) + 1
+        month_days = ((month_start + 1).astype("datetime64[D]") - month_start.astype("datetime64[D]")).astype(numpy.int64)
+        # 1970-01-01 was a Thursday
+        weekday = (days + 4) % 7
+
+        m = self.matchers
+        match = _mask_table(m.second.mask, 60)[seconds % 60]
+        match &= _mask_table(m.minute.mask, 60)[seconds // 60 % 60]
+        match &= _mask_table(m.hour.mask, 24)[seconds // 3600]
+        match &= _mask_table(m.month.mask, 13)[month]
+        day_match = _mask_table(m.day.mask, 32)[day]
+        if m.day.last:
+            day_match |= day == month_days
+        match &= day_match
+        weekday_match = _mask_table(m.weekday.mask, 7)[weekday]
+        if m.weekday.last:
+            weekday_match |= _mask_table(m.weekday.last, 7)[weekday] & (day + 7 > month_days)
+        match &= weekday_match
+        if not m.year.any:
+            start, end = _ranges[YEAR_OFFSET]
+            match &= (year >= start) & (year <= end)
+            match &= _mask_table(m.year.mask >> start, end - start + 1)[numpy.clip(year - start, 0, end - start)]
+        return match
+
+
+class CronScheduler(object):
+    """
+    Keeps many (key, CronTab) registrations in a min-heap ordered by their
+    next fire time, so that finding the due entries only touches the ones
+    that are due. Each entry carries a CronTab.iter() generator, so it is
+    re-armed from its own last fire time.
+
+    Removal and rescheduling invalidate the old heap item instead of
+    searching for it; stale items are dropped when they reach the top or
+    when they outnumber the live ones.
+    """
+
+    __slots__ = "_heap", "_entries", "_counter", "_stale"
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def add(self, key, crontab, now=None):
+        """
+        Registers `crontab` (a CronTab or an expression) under `key`, firing
+        after `now` (a datetime, defaults to datetime.now()). Adding an
+        existing key replaces its schedule.
+        """
+        if not isinstance(crontab, CronTab):
+            crontab = CronTab(crontab)
+        if key in self._entries:
+            self._discard(key)
+        fires = crontab.iter(now or datetime.now())
+        fire = next(fires, None)
+        if fire is None:
+            return
+        seq = next(self._counter)
+        self._entries[key] = (crontab, fires, seq)
+        heapq.heappush(self._heap, (fire, seq, key))
+
+    def remove(self, key):
+        """
+        Unregisters `key`, raising KeyError if it is not registered.
+        """
+        if key not in self._entries:
+            raise KeyError(key)
+        self._discard(key)
+
+    def reschedule(self, key, crontab=None, now=None):
+        """
+        Re-arms `key` from `now`, optionally with a new crontab.
+        """
+        if key not in self._entries:
+            raise KeyError(key)
+        self.add(key, crontab or self._entries[key][0], now)
+
+    def peek(self):
+        """
+        Returns the (fire time, key) pair that is due first, or None.
+        """
+        heap = self._heap
+        while heap and self._is_stale(heap[0]):
+            heapq.heappop(heap)
+            self._stale -= 1
+        if not heap:
+            return None
+        fire, _, key = heap[0]
+        return fire, key
+
+    def pop_due(self, now=None):
+        """
+        Returns the (fire time, key) pairs due at or before `now`, in fire
+        time order, and re-arms each of them to its following fire time.
+        An entry that fell behind by several occurrences is returned once
+        per occurrence.
+        """
+        now = now or datetime.now()
+        heap, entries, due = self._heap, self._entries, []
+        while heap and heap[0][0] <= now:
+            item = heap[0]
+            if self._is_stale(item):
+                heapq.heappop(heap)
+                self._stale -= 1
+                continue
+            fire, seq, key = item
+            due.append((fire, key))
+            fire = next(entries[key][1], None)
+            if fire is None:
+                heapq.heappop(heap)
+                del entries[key]
+            else:
+                heapq.heapreplace(heap, (fire, seq, key))
+        return due
+
+    def _is_stale(self, item):
+        entry = self._entries.get(item[2])
+        return entry is None or entry[2] != item[1]
+
+    def _discard(self, key):
+        del self._entries[key]
+        self._stale += 1
+        if self._stale > len(self._entries):
+            self._heap = [item for item in self._heap if not self._is_stale(item)]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+
+_EPOCH = datetime(1970, 1, 1)
+_UNSEARCHED = object()
+
+
+class CronCursor(object):
+    """
+    Answers "when does this entry next fire after t" for a stream of times
+    that never decreases, such as a replayed event log. The last fire time
+    found is kept: a t before it gets that fire time back without a search,
+    and only a t at or past it searches again, so n times cost n
+    comparisons plus one search per fire time crossed.
+    """
+
+    __slots__ = "crontab", "_now", "_fire"
+
+    def __init__(self, crontab):
+        if not isinstance(crontab, CronTab):
+            crontab = CronTab(crontab)
+        self.crontab = crontab
+        self._now = None
+        self._fire = _UNSEARCHED
+
+    def next(self, now):
+        """
+        Returns the first fire time strictly after `now`, or None if the
+        entry never fires again. `now` is either a datetime, answered with a
+        datetime in the same timezone as with CronTab.iter(), or epoch
+        seconds treated as UTC, answered with epoch seconds. Raises
+        ValueError if `now` is earlier than the previous call's.
+        """
+        _assert(self._now is None or now >= self._now, "cursor times must not decrease: %r after %r", now, self._now)
+        self._now = now
+        fire = self._fire
+        if fire is None or (fire is not _UNSEARCHED and now < fire):
+            return fire
+
+        if isinstance(now, _number_types):
+            fire = self.crontab._find_next(datetime.utcfromtimestamp(now).replace(microsecond=0) + SECOND)
+            if fire is not None:
+                fire = (fire - _EPOCH).total_seconds()
+        else:
+            fire = next(self.crontab.iter(now), None)
+        self._fire = fire
+        return fire
+
+
+def next_many(crontabs, now=None, workers=None, chunksize=10000):
+    """
+    Computes the next fire time after `now` for each of `crontabs` (CronTab
+    objects or expressions), returned in input order as an array of epoch
+    seconds, with nan where an entry never fires again. Naive datetimes
+    count as UTC, as with next(delta=False).
+
+    Identical expressions, and expressions that compile to the same
+    matchers, are computed once. The unique ones are compiled here and sent
+    to a pool of `workers` processes (one per CPU by default) in chunks of
+    `chunksize`, so workers unpickle compiled tables instead of parsing.
+    """
+    now = now or datetime.now()
+    by_input, by_matchers, unique, positions = {}, {}, [], []
+    for crontab in crontabs:
+        position = by_input.get(crontab)
+        if position is None:
+            ct = crontab if isinstance(crontab, CronTab) else CronTab(crontab)
+            position = by_matchers.setdefault(id(ct.matchers), len(unique))
+            if position == len(unique):
+                unique.append(ct)
+            by_input[crontab] = position
+        positions.append(position)
+
+    if workers == 1 or len(unique) <= chunksize:
+        fires = _next_fires(unique, now)
+    else:
+        chunks = [unique[i : i + chunksize] for i in xrange(0, len(unique), chunksize)]
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(workers) as pool:
+            fires = array.array("d")
+            for chunk in pool.map(_next_fires, chunks, itertools.repeat(now)):
+                fires.extend(chunk)
+    return array.array("d", (fires[position] for position in positions))
+
+
+CronLoad = namedtuple("CronLoad", "start, resolution, counts, peak, peak_at, colliding")
+
+
+def analyze_load(crontabs, start, end, resolution=60):
+    """
+    Builds a histogram of how many times `crontabs` fire in each bucket of
+    `resolution` seconds (which must divide a day) between `start` and
+    `end`, rounded out to whole buckets. `crontabs` is a mapping of keys to
+    CronTab objects or expressions, or a sequence of them keyed by index.
+
+    Returns a CronLoad with the bucket counts, the peak count, the start
+    of the first bucket reaching it, and the keys that fire in it.
+
+    Nothing is enumerated with next(): each distinct compiled crontab
+    gives a per-day profile of fires per bucket from its hour, minute and
+    second fields, and each day adds up the profiles of the crontabs whose
+    day fields match it. Days matched by the same crontabs share one
+    summed profile.
+    """
+    _assert(resolution > 0 and 86400 % resolution == 0, "resolution must divide a day, you provided %r", resolution)
+    items = crontabs.items() if isinstance(crontabs, dict) else enumerate(crontabs)
+    groups = {}
+    for key, crontab in items:
+        crontab = crontab if isinstance(crontab, CronTab) else CronTab(crontab)
+        groups.setdefault(id(crontab.matchers), (crontab, []))[1].append(key)
+    groups = list(groups.values())
+    profiles = [crontab._day_profile(resolution) for crontab, _ in groups]
+
+    per_day = 86400 // resolution
+    day = datetime(start.year, start.month, start.day)
+    offset = -((start - day) // SECOND // resolution)
+    start = day + timedelta(seconds=-offset * resolution)
+    total = -(-((end - start) // SECOND) // resolution)
+    counts = array.array("q", bytes(8 * max(total, 0)))
+
+    # day bitmasks of each group for the current month, and summed profiles
+    # keyed by the bitmask of the groups matching a day
+    months, summed = None, {}
+    while offset < total:
+        if months is None or day.day == 1:
+            months = [
+                crontab._year_allowed(day.year)
+                and crontab.matchers.month.mask >> day.month & 1
+                and crontab._month_days(day.year, day.month)
+                for crontab, _ in groups
+            ]
+        matching = 0
+        for i, allowed in enumerate(months):
+            if allowed and allowed >> day.day & 1:
+                matching |= 1 << i
+        if matching:
+            profile = summed.get(matching)
+            if profile is None:
+                profile = summed[matching] = [0] * per_day
+                for i in _bits(matching):
+                    weight = len(groups[i][1])
+                    for bucket, fires in profiles[i].items():
+                        profile[bucket] += fires * weight
+            for bucket in xrange(max(0, -offset), min(per_day, total - offset)):
+                counts[offset + bucket] += profile[bucket]
+        day += DAY
+        offset += per_day
+
+    if not total or not max(counts):
+        return CronLoad(start, resolution, counts, 0, None, [])
+    peak = max(counts)
+    index = counts.index(peak)
+    peak_at = start + timedelta(seconds=index * resolution)
+    day = datetime(peak_at.year, peak_at.month, peak_at.day)
+    bucket = (peak_at - day) // SECOND // resolution
+    colliding = [
+        key
+        for (crontab, keys), profile in zip(groups, profiles)
+        if bucket in profile and crontab._day_allowed(day)
+        for key in keys
+    ]
+    return CronLoad(start, resolution, counts, peak, peak_at, colliding)
+
+
+def _next_fires(crontabs, now):
+    fires = array.array("d")
+    for crontab in crontabs:
+        fire = next(crontab.iter(now), None)
+        if fire is None:
+            fires.append(float("nan"))
+        elif fire.tzinfo is None:
+            fires.append(_to_tick(fire))
+        else:
+            fires.append(fire.timestamp())
+    return fires
+
+
+class CronTimingWheel(object):
+    """
+    A hierarchical timing wheel for second resolution schedules.
+
+    Entries sit in a seconds wheel when they fire within the current
+    minute, in a minutes wheel when they fire within the current hour, in
+    an hours wheel when they fire today, and in an overflow bucket
+    otherwise. Each tick expires one seconds slot, and at minute, hour and
+    day boundaries the matching slot of the wheel above is cascaded down,
+    so adding, removing and expiring an entry costs O(1) however many
+    entries are registered. CronTab is only searched to re-arm an entry
+    after it fires, once per distinct crontab and fire time.
+
+    Times are naive datetimes on the caller's clock, as with CronTab.iter().
+    """
+
+    __slots__ = "_now", "_wheels", "_entries", "_following"
+
+    def __init__(self, now=None):
+        self._now = _to_tick(now or datetime.now())
+        # seconds, minutes, hours and the overflow bucket
+        self._wheels = [[{} for _ in xrange(60)], [{} for _ in xrange(60)], [{} for _ in xrange(24)], [{}]]
+        self._entries = {}
+        # id(matchers) -> (matchers, next fire tick) for the current tick
+        self._following = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def add(self, key, crontab):
+        """
+        Registers `crontab` (a CronTab or an expression) under `key`, firing
+        after the wheel's current time. Adding an existing key replaces its
+        schedule.
+        """
+        if not isinstance(crontab, CronTab):
+            crontab = CronTab(crontab)
+        if key in self._entries:
+            self.remove(key)
+        fire = self._next_tick(crontab)
+        if fire is not None:
+            self._place(key, crontab, fire)
+
+    def remove(self, key):
+        """
+        Unregisters `key`, raising KeyError if it is not registered.
+        """
+        _, fire, level, slot = self._entries.pop(key)
+        del self._wheels[level][slot][key]
+
+    def advance(self, now=None):
+        """
+        Moves the wheel forward to `now` and returns the (fire time, key)
+        pairs that expired on the way, in fire time order. Each expired entry
+        is re-armed to its following fire time. Seconds at which no slot
+        expires or cascades are skipped.
+        """
+        target = _to_tick(now or datetime.now())
+        seconds, minutes, hours, overflow = self._wheels
+        due = []
+        while self._now < target:
+            self._now = tick = self._next_event(target)
+            if self._following:
+                self._following = {}
+            if not tick % 86400:
+                self._cascade(overflow, 0)
+            if not tick % 3600:
+                self._cascade(hours, tick // 3600 % 24)
+            if not tick % 60:
+                self._cascade(minutes, tick // 60 % 60)
+            expired = seconds[tick % 60]
+            if not expired:
+                continue
+            seconds[tick % 60] = {}
+            fire = _from_tick(tick)
+            for key in expired:
+                crontab = self._entries[key][0]
+                due.append((fire, key))
+                following = self._next_tick(crontab)
+                if following is None:
+                    del self._entries[key]
+                else:
+                    self._place(key, crontab, following)
+        return due
+
+    def _next_event(self, target):
+        """
+        Returns the first tick after the current one, and at most `target`,
+        at which a slot expires or cascades. Each wheel only holds entries
+        after the current slot of the wheel below, so the first non-empty
+        slot found from the bottom up is the next one to act.
+        """
+        now = self._now
+        seconds, minutes, hours, overflow = self._wheels
+        for slot in xrange(now % 60 + 1, 60):
+            if seconds[slot]:
+                return min(now - now % 60 + slot, target)
+        for slot in xrange(now // 60 % 60 + 1, 60):
+            if minutes[slot]:
+                return min(now - now % 3600 + slot * 60, target)
+        for slot in xrange(now // 3600 % 24 + 1, 24):
+            if hours[slot]:
+                return min(now - now % 86400 + slot * 3600, target)
+        if overflow[0]:
+            return min(min(overflow[0].values()) // 86400 * 86400, target)
+        return target
+
+    def _next_tick(self, crontab):
+        # entries sharing a compiled crontab share one search per tick; the
+        # matchers are kept in the cache so that their id cannot be reused
+        following = self._following.get(id(crontab.matchers))
+        if following is None:
+            fire = crontab._find_next(_from_tick(self._now + 1))
+            following = crontab.matchers, None if fire is None else _to_tick(fire)
+            self._following[id(crontab.matchers)] = following
+        return following[1]
+
+    def _cascade(self, wheel, slot):
+        entries = wheel[slot]
+        wheel[slot] = {}
+        for key, fire in entries.items():
+            self._place(key, self._entries[key][0], fire)
+
+    def _place(self, key, crontab, fire):
+        now = self._now
+        if fire // 60 == now // 60:
+            level, slot = 0, fire % 60
+        elif fire // 3600 == now // 3600:
+            level, slot = 1, fire // 60 % 60
+        elif fire // 86400 == now // 86400:
+            level, slot = 2, fire // 3600 % 24
+        else:
+            level, slot = 3, 0
+        self._wheels[level][slot][key] = fire
+        self._entries[key] = (crontab, fire, level, slot)
+
+
+def _to_tick(dt):
+    return (dt.replace(tzinfo=None) - _EPOCH) // SECOND
+
+
+def _from_tick(tick):
+    return _EPOCH + timedelta(seconds=tick)
+
+
+def _first_tick(utc, forward):
+    # the first whole second strictly after, or before, the naive UTC datetime `utc`
+    tick = _to_tick(utc)
+    return tick + 1 if forward else tick - (not utc.microsecond)
+
+
+def _zoned_tick(dt, tz):
+    # the UTC epoch second of `dt`, taken as a local time in `tz` if it is naive
+    if dt.tzinfo is None:
+        localize = getattr(tz, "localize", None)
+        dt = localize(dt) if localize is not None else dt.replace(tzinfo=tz)
+    return _to_tick(dt.replace(tzinfo=None) - _fix_none(dt.utcoffset()))
+
+
+OVERLAP_SKIP, OVERLAP_QUEUE, OVERLAP_PARALLEL = "skip", "queue", "parallel"
+
+
+class CronRunner(object):
+    """
+    Runs coroutine functions on crontab schedules from a single asyncio task.
+
+    All schedules share one CronScheduler, and the runner sleeps until the
+    earliest fire time. Sleeps go through the event loop's monotonic clock,
+    and fire times come from the schedule rather than from summed sleeps,
+    so they do not drift. `concurrency` caps the number of jobs running at
+    once. `overlap` decides what happens when a job is due while its
+    previous run is still going: OVERLAP_SKIP drops the new run,
+    OVERLAP_QUEUE runs it once the previous one finishes, and
+    OVERLAP_PARALLEL starts it right away.
+    """
+
+    def __init__(self, concurrency=None, overlap=OVERLAP_SKIP, clock=datetime.now):
+        _assert(overlap in (OVERLAP_SKIP, OVERLAP_QUEUE, OVERLAP_PARALLEL), "unknown overlap policy: %r", overlap)
+        self._scheduler = CronScheduler()
+        self._jobs = {}
+        self._running = {}
+        self._queued = {}
+        self._tasks = set()
+        self._concurrency = concurrency
+        self._overlap = overlap
+        self._clock = clock
+        # asyncio primitives bind to a loop when created before Python 3.10,
+        # so they are only made once the runner is used from inside one
+        self._semaphore = None
+        self._wakeup = None
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def add(self, key, crontab, func, overlap=None):
+        """
+        Schedules `func()`, a coroutine function, to run whenever `crontab`
+        fires. `overlap` overrides the runner's overlap policy for this job.
+        """
+        overlap = overlap or self._overlap
+        _assert(overlap in (OVERLAP_SKIP, OVERLAP_QUEUE, OVERLAP_PARALLEL), "unknown overlap policy: %r", overlap)
+        self._scheduler.add(key, crontab, self._clock())
+        self._jobs[key] = (func, overlap)
+        self._wake()
+
+    def remove(self, key):
+        self._scheduler.remove(key)
+        del self._jobs[key]
+        self._queued.pop(key, None)
+        self._wake()
+
+    def stop(self):
+        """
+        Makes run() return once the jobs that are already running finish. If
+        run() has not started yet, it returns as soon as it does.
+        """
+        self._stopped = True
+        self._wake()
+
+    async def run(self):
+        import asyncio
+
+        self._semaphore = None
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            while not self._stopped:
+                self._wakeup.clear()
+                for fire, key in self._scheduler.pop_due(self._clock()):
+                    self._fire(key)
+                upcoming = self._scheduler.peek()
+                timeout = None
+                if upcoming is not None:
+                    timeout = max((upcoming[0] - self._clock()).total_seconds(), 0)
+                deadline = None if timeout is None else loop.time() + timeout
+                while not self._stopped and not self._wakeup.is_set():
+                    remaining = None if deadline is None else deadline - loop.time()
+                    if remaining is not None and remaining <= 0:
+                        break
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            # reset on the way out, so that a stop() made before run() is not lost
+            self._stopped = False
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _fire(self, key):
+        if key not in self._jobs:
+            return
+        func, overlap = self._jobs[key]
+        if self._running.get(key) and overlap != OVERLAP_PARALLEL:
+            if overlap == OVERLAP_QUEUE:
+                self._queued[key] = self._queued.get(key, 0) + 1
+            return
+        import asyncio
+
+        self._running[key] = self._running.get(key, 0) + 1
+        task = asyncio.ensure_future(self._call(key, func))
+        self._tasks.add(task)
+        task.add_done_callback(functools.partial(self._done, key))
+
+    async def _call(self, key, func):
+        import asyncio
+
+        if self._concurrency and self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        try:
+            if self._semaphore is None:
+                await func()
+            else:
+                async with self._semaphore:
+                    await func()
+        except Exception:
+            logger.exception("cron job %r failed", key)
+
+    def _done(self, key, task):
+        self._tasks.discard(task)
+        self._running[key] -= 1
+        if not self._running[key]:
+            del self._running[key]
+        if self._queued.get(key):
+            self._queued[key] -= 1
+            self._fire(key)
+
+
+def _mask_table(mask, size):
+    """
+    Expands a bitmask into a numpy boolean lookup table of `size` entries.
+    """
+    import numpy
+
+    return numpy.array([(mask >> v) & 1 for v in xrange(size)], dtype=bool)
+
 
 def _fix_none(d, _=timedelta(0)):
     if d is None:
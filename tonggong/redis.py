@@ -1,7 +1,9 @@
 import contextlib
+import datetime
 import os
 import signal
 import time
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Tuple, Union
 
 from redis import Redis
 from redis.exceptions import LockError
@@ -9,6 +11,9 @@ from redis.lock import Lock
 
 from tonggong.hash import Hash
 
+if TYPE_CHECKING:
+    from tonggong.crontab import CronTab
+
 _COUNT = 400
 
 
@@ -130,3 +135,160 @@ class RedisLock(Lock):
             signal.signal(signal.SIGINT, self._prev_sigint)
         if self._prev_sigterm is not None:
             signal.signal(signal.SIGTERM, self._prev_sigterm)
+
+
+class CronClaim(object):
+    """在多个节点上运行同一个 crontab 任务时，保证每次触发只由一个节点执行
+
+    每次触发用 (job_id, 触发时间戳) 作为 key 执行一次 SET NX PX，
+    抢到的节点执行任务，没抢到的节点一次往返就能得知结果并继续等待下一次触发。
+    """
+
+    def __init__(self, conn: Redis, job_id: str, crontab: Union["CronTab", str], expire: int = 600 * 1000):
+        from tonggong.crontab import CronTab
+
+        self.conn = conn
+        self.job_id = job_id
+        self.crontab = crontab if isinstance(crontab, CronTab) else CronTab(crontab)
+        self.expire = expire  # 毫秒，需要大于各节点之间的时钟误差
+
+    @classmethod
+    def get_key_name(cls, job_id: str, fire: datetime.datetime) -> str:
+        """Get Redis claim key name"""
+        return f"cron-claim:{job_id}:{int(fire.timestamp())}"
+
+    def claim(self, fire: datetime.datetime) -> bool:
+        """抢占 fire 这次触发，成功返回 True"""
+        key = self.get_key_name(self.job_id, fire)
+        return bool(self.conn.set(key, str(time.time()), nx=True, px=self.expire))
+
+    def fires(
+        self, now: Optional[datetime.datetime] = None, sleep: Callable[[float], None] = time.sleep
+    ) -> Iterator[datetime.datetime]:
+        """依次等待 now 之后的每次触发，只返回本节点抢到的触发时间"""
+        for fire in self.crontab.iter(now or datetime.datetime.now()):
+            delay = fire.timestamp() - time.time()
+            if delay > 0:
+                sleep(delay)
+            if self.claim(fire):
+                yield fire
+
+
+# 取出 score <= ARGV[1] 的最多 ARGV[2] 个任务，把 score 改为租约到期时间 ARGV[3]，
+# 返回 [job_id, score, expression, ...]
+_CLAIM_SCRIPT = """
+local due = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "WITHSCORES", "LIMIT", 0, ARGV[2])
+local result = {}
+for i = 1, #due, 2 do
+    redis.call("ZADD", KEYS[1], ARGV[3], due[i])
+    table.insert(result, due[i])
+    table.insert(result, due[i + 1])
+    table.insert(result, redis.call("HGET", KEYS[2], due[i]) or "")
+end
+return result
+"""
+
+# ARGV[1] 为租约到期时间，之后为 [job_id, 下次触发时间 或 "", ...]；
+# 只更新仍处于本次租约中的任务，期间被删除或重新添加的任务保持不变
+_RESCORE_SCRIPT = """
+for i = 2, #ARGV, 2 do
+    if tonumber(redis.call("ZSCORE", KEYS[1], ARGV[i])) == tonumber(ARGV[1]) then
+        if ARGV[i + 1] == "" then
+            redis.call("ZREM", KEYS[1], ARGV[i])
+            redis.call("HDEL", KEYS[2], ARGV[i])
+        else
+            redis.call("ZADD", KEYS[1], ARGV[i + 1], ARGV[i])
+        end
+    end
+end
+return 0
+"""
+
+
+class CronJobStore(object):
+    """保存在 Redis 中、由多个 worker 共享的 crontab 任务表
+
+    hash 保存 job_id -> crontab 表达式，zset 保存每个任务下次触发的时间戳。
+    claim() 用一次 Lua 脚本原子地取出一批到期任务，并把它们的 score 改为租约到期时间，
+    再由 CronTab 计算下次触发时间后一次写回。持有租约的 worker 挂掉时，任务在租约到期后重新可被领取。
+    表达式中的 H 以 job_id 为 seed 展开。
+    """
+
+    def __init__(self, conn: Redis, name: str, lease: int = 60 * 1000):
+        self.conn = conn
+        self.name = name
+        self.lease = lease  # 毫秒，需要大于处理一批任务的时间
+        self.jobs_key, self.due_key = self.get_key_names(name)
+        self._claim = conn.register_script(_CLAIM_SCRIPT)
+        self._rescore = conn.register_script(_RESCORE_SCRIPT)
+
+    @classmethod
+    def get_key_names(cls, name: str) -> Tuple[str, str]:
+        """Get Redis job hash and due zset key names"""
+        return f"cron-jobs:{name}", f"cron-jobs:{name}:due"
+
+    def __len__(self) -> int:
+        return self.conn.hlen(self.jobs_key)
+
+    def __contains__(self, job_id: str) -> bool:
+        return bool(self.conn.hexists(self.jobs_key, job_id))
+
+    def add(self, job_id: str, crontab: Union["CronTab", str], now: Optional[datetime.datetime] = None) -> bool:
+        """添加或替换任务，从 now 之后开始触发；表达式不会再触发时返回 False 且不添加"""
+        from tonggong.crontab import CronTab
+
+        if isinstance(crontab, CronTab):
+            crontab = " ".join(matcher.input for matcher in crontab.matchers)
+        fire = next(CronTab(crontab, seed=job_id).iter(now or datetime.datetime.now()), None)
+        if fire is None:
+            return False
+        pipe = self.conn.pipeline()
+        pipe.hset(self.jobs_key, job_id, crontab)
+        pipe.zadd(self.due_key, {job_id: fire.timestamp()})
+        pipe.execute()
+        return True
+
+    def remove(self, job_id: str) -> bool:
+        """删除任务，任务不存在时返回 False"""
+        pipe = self.conn.pipeline()
+        pipe.hdel(self.jobs_key, job_id)
+        pipe.zrem(self.due_key, job_id)
+        return bool(pipe.execute()[0])
+
+    def get(self, job_id: str) -> Optional[str]:
+        """返回任务的 crontab 表达式"""
+        expression = self.conn.hget(self.jobs_key, job_id)
+        return expression.decode() if isinstance(expression, bytes) else expression
+
+    def next_fire(self, job_id: str) -> Optional[datetime.datetime]:
+        """返回任务下次触发时间，任务被领取尚未写回时为租约到期时间"""
+        score = self.conn.zscore(self.due_key, job_id)
+        return None if score is None else datetime.datetime.fromtimestamp(score)
+
+    def claim(self, count: int = 100, now: Optional[datetime.datetime] = None) -> List[Tuple[str, datetime.datetime]]:
+        """领取最多 count 个在 now 之前到期的任务，返回 (job_id, 触发时间) 列表
+
+        每个任务的下次触发时间从 now 和本次触发时间中较晚的一个开始计算，
+        落后多次的任务只返回一次；租约到期后被重新领取的任务，触发时间为租约到期时间。
+        """
+        from tonggong.crontab import CronTab
+
+        now = now or datetime.datetime.now()
+        lease = repr(now.timestamp() + self.lease / 1000)
+        due = self._claim(keys=[self.due_key, self.jobs_key], args=[now.timestamp(), count, lease])
+        if not due:
+            return []
+
+        claimed, args = [], []
+        for i in range(0, len(due), 3):
+            job_id, score, expression = (v.decode() if isinstance(v, bytes) else v for v in due[i : i + 3])
+            if not expression:
+                # 只剩 zset 中的残留项，随后删除
+                args += [job_id, ""]
+                continue
+            fire = datetime.datetime.fromtimestamp(float(score))
+            claimed.append((job_id, fire))
+            following = next(CronTab(expression, seed=job_id).iter(max(fire, now)), None)
+            args += [job_id, "" if following is None else following.timestamp()]
+        self._rescore(keys=[self.due_key, self.jobs_key], args=[lease] + args)
+        return claimed